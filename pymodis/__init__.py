@@ -1,6 +1,7 @@
 from __future__ import print_function
 import warnings
 
+from . import granulemodis
 from . import downmodis
 from . import parsemodis
 from . import convertmodis
@@ -13,6 +14,15 @@ except ImportError:
                   "maybe Python GDAL is missing", ImportWarning)
     pass
 from . import productmodis
+from . import tilesmodis
+from . import checkmodis
+from . import batchmodis
+from . import pipelinemodis
+try:
+    from . import downmodis_async
+except ImportError:
+    warnings.warn("downmodis_async module not enabled, maybe aiohttp is "
+                  "missing", ImportWarning)
 try:
     from . import optparse_gui
 except:
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+#  class to download several MODIS products and periods in one process
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to download several MODIS products, tiles and periods with a
+single scheduler. The jobs share the HTTP session, the listing cache, the
+rate limits and the worker threads; the most recent days are downloaded
+first, alternating the products
+
+Classes:
+
+* :class:`PriorityPool`
+* :class:`BatchDownload`
+
+Functions:
+
+* :func:`readJobs`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+
+from .downmodis import downModis
+from .downmodis import yearlyWindows
+from .downmodis import DownloadMetrics
+from .downmodis import ListingCache
+from .downmodis import RateLimiter
+from .downmodis import RetryPolicy
+
+#: the keys of a job, the others are passed to downModis
+JOBKEYS = ('destination', 'windows', 'yearly', 'alldays')
+#: the options of downModis that can be set for each job
+JOBOPTIONS = ('url', 'path', 'product', 'tiles', 'today', 'enddate', 'delta',
+              'jpg', 'bbox', 'aoi', 'search')
+
+
+def readJobs(filename, defaults=None):
+    """Read the jobs from a JSON file. The file contains a list of jobs or
+       an object with the list in 'jobs' and the values shared by all the
+       jobs in 'defaults'. A job is an object with the options of
+       downModis (url, path, product, tiles, today, enddate, delta, jpg,
+       bbox, aoi, search) and
+
+       * destination: the folder where the files are stored
+       * windows: a list of periods [start, end] to download
+       * yearly: the same period of several years, an object with start
+         and end in format MM-DD and the years as [first, last]
+       * alldays: true to download all the days on the server
+
+       :param str filename: the path of the JSON file
+       :param dict defaults: the values used when they are not set in the
+                             file
+
+       :return: a list of dictionaries, one for each job
+    """
+    with open(filename) as f:
+        content = json.load(f)
+    if isinstance(content, dict):
+        jobs = content.get('jobs', [])
+        defaults = dict(defaults or {}, **content.get('defaults', {}))
+    else:
+        jobs = content
+    return [dict(defaults or {}, **job) for job in jobs]
+
+
+class PriorityPool:
+    """A pool of threads running the tasks with the lowest priority value
+       first, the tasks with the same priority run in the order they are
+       added. A task can add other tasks
+
+       :param int workers: the number of threads
+    """
+    def __init__(self, workers):
+        """Function to initialize the object"""
+        self.workers = max(1, int(workers))
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = []
+        #: the exceptions raised by the tasks
+        self.errors = []
+
+    def submit(self, priority, func, *args):
+        """Add a task
+
+           :param priority: the priority of the task, a comparable value
+           :param func: the function to run
+           :param args: the arguments of the function
+        """
+        self._queue.put((priority, next(self._counter), func, args))
+
+    def _work(self):
+        """Run the tasks until None is found in the queue"""
+        while True:
+            priority, _, func, args = self._queue.get()
+            try:
+                if func is None:
+                    return
+                func(*args)
+            except Exception as e:
+                logging.error("Error in the batch download: {err}".format(
+                    err=e))
+                self.errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def run(self):
+        """Start the threads and wait until all the tasks are done"""
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        self._queue.join()
+        # None is the last task of each thread, it has the highest priority
+        # value so it runs after the tasks
+        for thread in self._threads:
+            self._queue.put(((float('inf'),), next(self._counter), None, ()))
+        for thread in self._threads:
+            thread.join()
+
+
+class BatchDownload:
+    """Download several jobs, each one a product with its tiles and periods,
+       sharing the authentication, the HTTP connections, the listing cache,
+       the rate limits and the threads. The days of all the jobs are
+       downloaded alternating the products, the most recent days first
+
+       :param list jobs: the jobs to download, see readJobs
+       :param str destinationFolder: where the files are stored if a job
+                                     does not set its destination
+       :param str password: the password required by NASA authentication
+                            system
+       :param str user: the user name required by NASA authentication
+                        system
+       :param str token: the token required by NASA authentication system
+       :param int workers: the number of files and listings downloaded in
+                           parallel by all the jobs
+       :param listcache: True to store the listings of all the jobs in the
+                         JSON file listcache.json inside destinationFolder,
+                         or a ListingCache object
+       :param bool statedb: True to store the state of the downloaded
+                            files, in a database for each destination
+                            folder and product
+       :param maxrate: maximum number of bytes per second downloaded by all
+                       the jobs, or a RateLimiter object; None == no limit
+       :param maxrequests: maximum number of requests per second sent by
+                           all the jobs, or a RateLimiter object; None == no
+                           limit
+       :param metrics: a DownloadMetrics object collecting the metrics of
+                       all the jobs, None == a new one kept in memory
+       :param kwargs: the other options of downModis, like checksum,
+                      timeout, retry and debug, used by all the jobs
+    """
+    def __init__(self, jobs, destinationFolder=None, password=None,
+                 user=None, token=None, workers=4, listcache=False,
+                 statedb=False, maxrate=None, maxrequests=None, metrics=None,
+                 **kwargs):
+        """Function to initialize the object"""
+        self.workers = max(1, int(workers))
+        if maxrate and not isinstance(maxrate, RateLimiter):
+            maxrate = RateLimiter(maxrate)
+        if maxrequests and not isinstance(maxrequests, RateLimiter):
+            maxrequests = RateLimiter(maxrequests)
+        if metrics is None:
+            metrics = DownloadMetrics()
+        self.metrics = metrics
+        if listcache is True:
+            if not destinationFolder:
+                raise IOError("The listing cache requires the destination "
+                              "folder")
+            listcache = ListingCache(os.path.join(destinationFolder,
+                                                  'listcache.json'))
+        self.listcache = listcache or None
+        if kwargs.get('retry') is None:
+            kwargs['retry'] = RetryPolicy()
+        # the threads of the pool are the only limit of the connections
+        kwargs.setdefault('hostconn', self.workers)
+        kwargs.setdefault('poolsize', max(10, self.workers))
+        self.session = None
+        #: the downModis object of each job
+        self.jobs = []
+        #: the periods of each job, see downModis.getDaysWindows
+        self.windows = []
+        self.alldays = []
+        # the file lists, databases, local indexes and locks shared by the
+        # jobs with the same destination and product
+        shared = {}
+        # the destination and product of each job
+        self._keys = {}
+        # the files already scheduled for each destination and product
+        self._scheduled = {}
+        self._lock = threading.Lock()
+        for job in jobs:
+            unknown = set(job) - set(JOBKEYS + JOBOPTIONS)
+            if unknown:
+                raise ValueError("Unknown options of the job: {opt}".format(
+                    opt=', '.join(sorted(unknown))))
+            if not job.get('product'):
+                raise ValueError("The product of a job is not set")
+            folder = job.get('destination', destinationFolder)
+            if not folder:
+                raise ValueError("The destination folder of the job {pro} "
+                                 "is not set".format(pro=job['product']))
+            options = dict((key, job[key]) for key in JOBOPTIONS
+                           if key in job)
+            options.update(kwargs)
+            key = (os.path.abspath(folder), job.get('path', 'MOLT'),
+                   job['product'])
+            state = statedb
+            if statedb and key in shared:
+                state = shared[key][0].state
+            modis = downModis(folder, password=password, user=user,
+                              token=token, workers=1, listcache=listcache,
+                              statedb=state, maxrate=maxrate,
+                              maxrequests=maxrequests, metrics=metrics,
+                              session=self.session, **options)
+            # the first job creates the session with the credentials
+            if self.session is None:
+                self.session = modis.session
+            # the jobs of the same product in the same folder write the
+            # same file list
+            if key in shared:
+                first = shared[key][0]
+                modis.closeFilelist()
+                modis.filelist = first.filelist
+                # the same local file is checked and replaced by only one
+                # job at a time
+                if first._localIndex is None:
+                    first._buildIndex()
+                modis._localIndex = first._localIndex
+                modis._lock = first._lock
+            else:
+                shared[key] = (modis,)
+            self._keys[modis] = key
+            self.jobs.append(modis)
+            windows = [tuple(win) for win in job.get('windows', [])]
+            if job.get('yearly'):
+                yearly = job['yearly']
+                windows.extend(yearlyWindows(yearly['start'], yearly['end'],
+                                             *yearly['years']))
+            self.windows.append(windows)
+            self.alldays.append(bool(job.get('alldays')))
+
+    def connect(self, ncon=20):
+        """Connect to the servers and list the days of every product, the
+           jobs of the same product share the same list
+
+           :param int ncon: maximum number of attempts to connect to the
+                            server before failing
+
+           :return: the number of jobs connected
+        """
+        listed = {}
+        connected = 0
+        for modis in self.jobs:
+            key = (modis.url, modis.path)
+            if key in listed and not modis.search:
+                modis.dirData = listed[key]
+            else:
+                try:
+                    modis.connect(ncon)
+                except Exception as e:
+                    logging.error("Error connecting to {url} for {pro}: "
+                                  "{err}".format(url=modis.url,
+                                                 pro=modis.product, err=e))
+                    continue
+                if not modis.search:
+                    listed[key] = modis.dirData
+            connected += 1
+        if self.listcache:
+            self.listcache.save()
+        return connected
+
+    def schedule(self):
+        """Return the days to download, the most recent day of each product
+           in turn. A day of the same tiles of a product in the same folder
+           is scheduled only once, even if it is in several jobs
+
+           :return: a list of tuples (downModis object, day)
+        """
+        products = {}
+        seen = set()
+        for modis, windows, alldays in zip(self.jobs, self.windows,
+                                           self.alldays):
+            if not modis.dirData:
+                continue
+            days = []
+            for day in modis._selectDays(alldays, windows):
+                key = (self._keys[modis], modis._tileset, day)
+                if key not in seen:
+                    seen.add(key)
+                    days.append(day)
+            products.setdefault(modis.product, []).extend(
+                (day, modis) for day in days)
+        queues = []
+        for product in sorted(products):
+            days = products[product]
+            # the sort is stable, the jobs keep their order in the same day
+            days.sort(key=lambda item: item[0], reverse=True)
+            queues.append([(modis, day) for day, modis in days])
+        order = []
+        for turn in itertools.zip_longest(*queues):
+            order.extend(item for item in turn if item is not None)
+        return order
+
+    def _listDay(self, pool, rank, modis, day):
+        """Get the files of a day and add their downloads to the pool
+
+           :param pool: the PriorityPool object
+           :param int rank: the position of the day in the schedule
+           :param modis: the downModis object of the job
+           :param str day: the day in format YYYY.MM.DD
+        """
+        listAllFiles = modis.getFilesList(day)
+        listFilesDown = modis.checkDataExist(listAllFiles)
+        # the jobs with overlapping tiles download a file only once
+        with self._lock:
+            scheduled = self._scheduled.setdefault(self._keys[modis], set())
+            listFilesDown = [name for name in listFilesDown
+                             if name not in scheduled]
+            scheduled.update(listFilesDown)
+        modis._startDay(day, listAllFiles, listFilesDown)
+        if modis.debug:
+            logging.debug("Scheduled {num} files of {pro} for day "
+                          "{day}".format(num=len(listFilesDown),
+                                         pro=modis.product, day=day))
+        # the files of a day run before the listings of the next days, the
+        # XML files before the HDF files like in downModis
+        for task in modis._fileTasks(day, listFilesDown):
+            pool.submit((rank, 0), modis._fileDownload, *task)
+
+    def downloadsAllJobs(self, clean=False):
+        """Download the days of all the jobs
+
+           :param bool clean: if True remove the empty files, they could have
+                              some problems in the previous download
+
+           :return: the summary of the metrics, see DownloadMetrics.summary
+        """
+        if clean:
+            for modis in self.jobs:
+                modis.removeEmptyFiles()
+        pool = PriorityPool(self.workers)
+        for rank, (modis, day) in enumerate(self.schedule()):
+            pool.submit((rank, 1), self._listDay, pool, rank, modis, day)
+        try:
+            pool.run()
+        finally:
+            self.close()
+        if pool.errors:
+            logging.error("{num} errors in the batch download".format(
+                num=len(pool.errors)))
+        return self.metrics.summary()
+
+    def close(self):
+        """Save the listing cache and close the connections and the file
+           lists of the jobs"""
+        if self.listcache:
+            self.listcache.save()
+        for modis in self.jobs:
+            if modis.urltype == 'ftp':
+                modis.closeFTP()
+            else:
+                modis.closeFilelist()
@@ -0,0 +1,911 @@
+#!/usr/bin/env python
+#  classes to measure the performance of the downloads with local servers
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to measure the performance of downModis without the NASA
+servers. A local HTTP server simulates the LP DAAC data pool, with the
+Earthdata authentication and its redirects, and a local FTP server
+simulates the FTP repositories; both add a configurable latency to every
+request and can limit the bandwidth of each connection.
+
+The benchmark can be run with ::
+
+    python -m pymodis.benchmodis --workers 1,4,8 --latency 0.05
+
+The filters of the listings, without servers, are measured with ::
+
+    python -m pymodis.benchmodis --listing 460,3
+
+Classes:
+
+* :class:`MockArchive`
+* :class:`MockHTTPServer`
+* :class:`MockFTPServer`
+
+Functions:
+
+* :func:`benchmark`
+* :func:`printResults`
+* :func:`benchmarkListing`
+* :func:`printListing`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+
+from datetime import date
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from optparse import OptionParser
+from urllib.parse import parse_qsl
+from urllib.parse import quote
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+import base64
+import hashlib
+import html
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from .downmodis import Cksum
+from .downmodis import downModis
+from .downmodis import filterFiles
+from .downmodis import modisHtmlParser
+from .granulemodis import GranuleName
+
+#: the size of the blocks sent by the servers (bytes)
+BLOCKSIZE = 65536
+
+
+class MockArchive:
+    """A folder with the structure of the NASA repositories, the day
+       directories of a product with HDF files, their XML metadata and the
+       browse JPG files
+
+       :param str folder: the folder of the archive, None == a new
+                          temporary folder removed by close
+       :param str product: the product with the version
+       :param str path: the directory of the products on the server
+       :param int days: the number of days, the last one is 2020-01-31
+       :param int tiles: the number of tiles of each day
+       :param int size: the size of the HDF files (bytes)
+    """
+    def __init__(self, folder=None, product='MOD11A1.061', path='MOLT',
+                 days=5, tiles=4, size=1048576):
+        """Function to initialize the object"""
+        self.temporary = folder is None
+        self.root = folder or tempfile.mkdtemp(prefix='pymodisbench')
+        self.product = product
+        self.path = path
+        self.size = int(size)
+        code, version = product.split('.')
+        last = date(2020, 1, 31)
+        #: the directories of the days
+        self.days = []
+        #: the names of the tiles
+        self.tiles = ['h{h:02d}v{v:02d}'.format(h=18 + i % 10, v=4 + i // 10)
+                      for i in range(int(tiles))]
+        #: the number of HDF files and of bytes of all the files
+        self.files = 0
+        self.bytes = 0
+        # the same random content for all the files
+        data = os.urandom(self.size)
+        cksum = Cksum()
+        cksum.update(data)
+        for i in range(int(days)):
+            day = last - timedelta(days=i)
+            name = day.strftime('%Y.%m.%d')
+            folder = os.path.join(self.root, path, product, name)
+            os.makedirs(folder)
+            self.days.append(name)
+            for tile in self.tiles:
+                hdf = '{co}.A{da}.{ti}.{ve}.{da}120000.hdf'.format(
+                    co=code, da=day.strftime('%Y%j'), ti=tile, ve=version)
+                xml = ('<GranuleMetaDataFile><GranuleURMetaData><DataFiles>'
+                       '<DataFileContainer><DistributedFileName>{na}'
+                       '</DistributedFileName><FileSize>{si}</FileSize>'
+                       '<ChecksumType>CKSUM</ChecksumType><Checksum>{ck}'
+                       '</Checksum></DataFileContainer></DataFiles>'
+                       '</GranuleURMetaData></GranuleMetaDataFile>').format(
+                           na=hdf, si=self.size, ck=cksum.hexdigest())
+                with open(os.path.join(folder, hdf), 'wb') as f:
+                    f.write(data)
+                with open(os.path.join(folder, hdf + '.xml'), 'w') as f:
+                    f.write(xml)
+                with open(os.path.join(folder, 'BROWSE.{na}.1.jpg'.format(
+                        na=hdf[:-4])), 'wb') as f:
+                    f.write(b'\xff\xd8\xff\xd9')
+                self.files += 1
+                self.bytes += self.size + len(xml)
+
+    def close(self):
+        """Remove the temporary folder"""
+        if self.temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+class _Throttle:
+    """Send the data of a file in blocks, limiting the bandwidth
+
+       :param int bandwidth: the bytes per second, None == no limit
+    """
+    def __init__(self, bandwidth=None):
+        """Function to initialize the object"""
+        self.bandwidth = bandwidth
+
+    def send(self, fileobj, write, offset=0):
+        """Send a file from offset, return the number of bytes sent
+
+           :param fileobj: the file opened in binary mode
+           :param write: the function sending the data
+           :param int offset: the position of the first byte
+        """
+        fileobj.seek(offset)
+        start = time.time()
+        sent = 0
+        while True:
+            block = fileobj.read(BLOCKSIZE)
+            if not block:
+                return sent
+            write(block)
+            sent += len(block)
+            if self.bandwidth:
+                wait = sent / float(self.bandwidth) - (time.time() - start)
+                if wait > 0:
+                    time.sleep(wait)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    """Handler of the requests of MockHTTPServer"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'pyModisBenchmark'
+
+    def log_message(self, *args):
+        """Do not log the requests"""
+        pass
+
+    def _empty(self, code, headers=()):
+        """Send a response without body"""
+        self.send_response(code)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _credentials(self):
+        """Return True if the Authorization header is valid"""
+        server = self.server.mock
+        auth = self.headers.get('Authorization') or ''
+        if server.token and auth == 'Bearer {to}'.format(to=server.token):
+            return True
+        basic = base64.b64encode('{us}:{pw}'.format(
+            us=server.user, pw=server.password).encode()).decode()
+        return auth == 'Basic {ba}'.format(ba=basic)
+
+    def _authenticated(self, url):
+        """Check the authentication of a request to the data server, with
+           the Earthdata flow: the clients without the session cookie are
+           redirected to the authentication host, which redirects them
+           back with a code exchanged for the cookie
+
+           :param url: the requested url split by urlsplit
+        """
+        server = self.server.mock
+        if not server.auth:
+            return True
+        cookie = self.headers.get('Cookie') or ''
+        for value in cookie.split(';'):
+            if value.strip() in server.sessions:
+                return True
+        # a bearer token is accepted directly by the data server
+        auth = self.headers.get('Authorization') or ''
+        if server.token and auth == 'Bearer {to}'.format(to=server.token):
+            return True
+        query = dict(parse_qsl(url.query))
+        if query.get('code') in server.codes:
+            server.codes.discard(query['code'])
+            session = 'session={id}'.format(id=uuid.uuid4().hex)
+            server.sessions.add(session)
+            self._empty(302, (('Set-Cookie', session + '; Path=/'),
+                              ('Location', url.path)))
+            return False
+        back = 'http://{ho}:{po}{pa}'.format(ho=server.host, po=server.port,
+                                             pa=url.path)
+        self._empty(302, (('Location', 'http://{ho}:{po}/oauth/authorize?'
+                           '{qu}'.format(ho=server.authhost, po=server.port,
+                                         qu=urlencode({'redirect_uri':
+                                                       back}))),))
+        return False
+
+    def _authorize(self, url):
+        """The authentication host, it redirects to the data server with a
+           code if the credentials are valid
+
+           :param url: the requested url split by urlsplit
+        """
+        server = self.server.mock
+        server.count('auth')
+        if not self._credentials():
+            self._empty(401, (('WWW-Authenticate', 'Basic realm="mock"'),))
+            return
+        code = uuid.uuid4().hex
+        server.codes.add(code)
+        redirect = dict(parse_qsl(url.query)).get('redirect_uri', '/')
+        self._empty(302, (('Location', '{re}?code={co}'.format(
+            re=redirect, co=code)),))
+
+    def _listing(self, folder):
+        """Send the HTML index of a directory"""
+        names = sorted(os.listdir(folder))
+        etag = '"{ha}"'.format(ha=hashlib.md5(
+            '\n'.join(names).encode()).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self._empty(304, (('ETag', etag),))
+            return
+        lines = ['<html><head><title>Index</title></head><body><pre>',
+                 '<a href="../">Parent Directory</a>']
+        for name in names:
+            if os.path.isdir(os.path.join(folder, name)):
+                name += '/'
+            lines.append('<a href="{hr}">{na}</a>'.format(
+                hr=quote(name), na=html.escape(name)))
+        lines.append('</pre></body></html>')
+        body = '\n'.join(lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, filename):
+        """Send a file, from the offset of the Range header if present"""
+        server = self.server.mock
+        size = os.path.getsize(filename)
+        offset = 0
+        rng = self.headers.get('Range') or ''
+        if rng.startswith('bytes='):
+            offset = int(rng[6:].split('-')[0] or 0)
+            if offset >= size:
+                self._empty(416, (('Content-Range',
+                                   'bytes */{si}'.format(si=size)),))
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {of}-{la}/{si}'.format(
+                of=offset, la=size - 1, si=size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size - offset))
+        self.end_headers()
+        with open(filename, 'rb') as f:
+            sent = server.throttle.send(f, self.wfile.write, offset)
+        server.count('bytes', sent)
+        server.count('files')
+
+    def do_GET(self):
+        """Answer a GET request"""
+        server = self.server.mock
+        server.count('requests')
+        time.sleep(server.latency)
+        url = urlsplit(self.path)
+        if url.path == '/oauth/authorize':
+            self._authorize(url)
+            return
+        if not self._authenticated(url):
+            return
+        filename = server.translate(url.path)
+        if filename and os.path.isdir(filename):
+            self._listing(filename)
+        elif filename and os.path.isfile(filename):
+            self._file(filename)
+        else:
+            self._empty(404)
+
+
+class _MockServer:
+    """The common methods of the mock servers"""
+    def translate(self, path):
+        """Return the local path of a path of the server, None if it is
+           outside the archive
+
+           :param str path: the path requested by the client
+        """
+        path = os.path.normpath('/' + path.strip('/'))
+        filename = os.path.join(self.archive.root, path.lstrip('/'))
+        if os.path.commonpath([self.archive.root, filename]) != \
+                self.archive.root:
+            return None
+        return filename
+
+    def count(self, key, value=1):
+        """Update a counter of the server statistics"""
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def start(self):
+        """Start the server in a thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class MockHTTPServer(_MockServer):
+    """A HTTP server simulating the LP DAAC data pool, with the directory
+       indexes read by modisHtmlParser, the resume of the downloads with
+       the Range header and the Earthdata authentication: the requests
+       without a session cookie are redirected to the authentication host,
+       which is the same server with the name authhost
+
+       :param archive: the MockArchive object to serve
+       :param float latency: seconds waited before every response
+       :param int bandwidth: bytes per second of each download, None == no
+                             limit
+       :param bool auth: False to serve the files without authentication
+       :param str user: the user name
+       :param str password: the password
+       :param str token: the token accepted as Bearer authentication
+       :param str host: the address of the server
+       :param str authhost: another name of the server, used as
+                            authentication host
+    """
+    def __init__(self, archive, latency=0.0, bandwidth=None, auth=True,
+                 user='user', password='password', token='token',
+                 host='127.0.0.1', authhost='localhost'):
+        """Function to initialize the object"""
+        self.archive = archive
+        self.latency = latency
+        self.throttle = _Throttle(bandwidth)
+        self.auth = auth
+        self.user = user
+        self.password = password
+        self.token = token
+        self.host = host
+        self.authhost = authhost
+        #: the codes and the session cookies given by the authentication
+        self.codes = set()
+        self.sessions = set()
+        #: the number of requests, authentications, files and bytes sent
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, 0), _HTTPHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self.port = self._server.server_address[1]
+        #: the url to use in downModis
+        self.url = 'http://{ho}:{po}'.format(ho=host, po=self.port)
+
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    """Handler of a control connection of MockFTPServer"""
+    def reply(self, text):
+        """Send a reply to the client"""
+        self.wfile.write('{te}\r\n'.format(te=text).encode('latin-1'))
+
+    def handle(self):
+        """Read the commands until QUIT"""
+        server = self.server.mock
+        self.cwd = '/'
+        self.user = None
+        self.logged = False
+        self.rest = 0
+        self.passive = None
+        self.reply('220 pyModis benchmark FTP server')
+        for line in self.rfile:
+            cmd, _, arg = line.decode('latin-1').strip().partition(' ')
+            cmd = cmd.upper()
+            server.count('requests')
+            time.sleep(server.latency)
+            method = getattr(self, 'ftp_' + cmd, None)
+            if method is None:
+                self.reply('502 Command not implemented')
+            elif not self.logged and cmd not in ('USER', 'PASS', 'QUIT'):
+                self.reply('530 Not logged in')
+            elif method(arg) is False:
+                break
+        if self.passive:
+            self.passive.close()
+
+    def _path(self, arg):
+        """Return the path on the server and the local path of an argument
+        """
+        path = os.path.normpath(os.path.join(self.cwd, arg or '.'))
+        path = '/' + path.strip('/') if path.strip('/') else '/'
+        return path, self.server.mock.translate(path)
+
+    def _data(self):
+        """Return the data connection opened by the client"""
+        if not self.passive:
+            raise IOError('no passive connection')
+        try:
+            conn, _ = self.passive.accept()
+        finally:
+            self.passive.close()
+            self.passive = None
+        return conn
+
+    def ftp_USER(self, arg):
+        self.user = arg
+        self.reply('331 Password required')
+
+    def ftp_PASS(self, arg):
+        server = self.server.mock
+        if self.user == server.user and arg == server.password:
+            self.logged = True
+            server.count('auth')
+            self.reply('230 Logged in')
+        else:
+            self.reply('530 Login incorrect')
+
+    def ftp_SYST(self, arg):
+        self.reply('215 UNIX Type: L8')
+
+    def ftp_TYPE(self, arg):
+        self.reply('200 Type set to {ty}'.format(ty=arg))
+
+    def ftp_NOOP(self, arg):
+        self.reply('200 NOOP ok')
+
+    def ftp_PWD(self, arg):
+        self.reply('257 "{cw}" is the current directory'.format(cw=self.cwd))
+
+    def ftp_CWD(self, arg):
+        path, local = self._path(arg)
+        if local and os.path.isdir(local):
+            self.cwd = path
+            self.reply('250 Directory changed to {pa}'.format(pa=path))
+        else:
+            self.reply('550 No such directory')
+
+    def ftp_CDUP(self, arg):
+        self.ftp_CWD('..')
+
+    def _listen(self):
+        """Open the socket of the passive data connection"""
+        if self.passive:
+            self.passive.close()
+        self.passive = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.passive.bind((self.server.mock.host, 0))
+        self.passive.listen(1)
+        self.passive.settimeout(30)
+        return self.passive.getsockname()[1]
+
+    def ftp_PASV(self, arg):
+        port = self._listen()
+        address = self.server.mock.host.replace('.', ',')
+        self.reply('227 Entering Passive Mode ({ad},{p1},{p2})'.format(
+            ad=address, p1=port >> 8, p2=port & 0xFF))
+
+    def ftp_EPSV(self, arg):
+        self.reply('229 Entering Extended Passive Mode (|||{po}|)'.format(
+            po=self._listen()))
+
+    def _send(self, lines):
+        """Send the lines of a listing on the data connection"""
+        self.reply('150 Here comes the directory listing')
+        conn = self._data()
+        with conn:
+            conn.sendall(''.join(line + '\r\n' for line in lines).encode(
+                'latin-1'))
+        self.reply('226 Directory send OK')
+
+    def ftp_LIST(self, arg):
+        path, local = self._path(arg if not arg.startswith('-') else '')
+        if not local or not os.path.isdir(local):
+            self.reply('550 No such directory')
+            return
+        lines = []
+        for name in sorted(os.listdir(local)):
+            full = os.path.join(local, name)
+            if os.path.isdir(full):
+                lines.append('drwxr-xr-x 2 ftp ftp 4096 Jan 31 12:00 '
+                             '{na}'.format(na=name))
+            else:
+                lines.append('-rw-r--r-- 1 ftp ftp {si} Jan 31 12:00 '
+                             '{na}'.format(si=os.path.getsize(full), na=name))
+        self._send(lines)
+
+    def ftp_NLST(self, arg):
+        path, local = self._path(arg)
+        if not local or not os.path.isdir(local):
+            self.reply('550 No such directory')
+            return
+        self._send(sorted(os.listdir(local)))
+
+    def ftp_SIZE(self, arg):
+        path, local = self._path(arg)
+        if local and os.path.isfile(local):
+            self.reply('213 {si}'.format(si=os.path.getsize(local)))
+        else:
+            self.reply('550 No such file')
+
+    def ftp_REST(self, arg):
+        self.rest = int(arg)
+        self.reply('350 Restarting at {re}'.format(re=self.rest))
+
+    def ftp_RETR(self, arg):
+        server = self.server.mock
+        path, local = self._path(arg)
+        rest, self.rest = self.rest, 0
+        if not local or not os.path.isfile(local):
+            self.reply('550 No such file')
+            return
+        self.reply('150 Opening BINARY mode data connection')
+        conn = self._data()
+        with conn, open(local, 'rb') as f:
+            sent = server.throttle.send(f, conn.sendall, rest)
+        server.count('bytes', sent)
+        server.count('files')
+        self.reply('226 Transfer complete')
+
+    def ftp_QUIT(self, arg):
+        self.reply('221 Goodbye')
+        return False
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    """A TCP server with a thread for each connection"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MockFTPServer(_MockServer):
+    """A FTP server simulating the NASA FTP repositories, it supports the
+       commands used by downModis with passive data connections
+
+       :param archive: the MockArchive object to serve
+       :param float latency: seconds waited before every reply
+       :param int bandwidth: bytes per second of each download, None == no
+                             limit
+       :param str user: the user name
+       :param str password: the password
+       :param str host: the address of the server
+    """
+    def __init__(self, archive, latency=0.0, bandwidth=None, user='user',
+                 password='password', host='127.0.0.1'):
+        """Function to initialize the object"""
+        self.archive = archive
+        self.latency = latency
+        self.throttle = _Throttle(bandwidth)
+        self.user = user
+        self.password = password
+        self.host = host
+        #: the number of requests, logins, files and bytes sent
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._server = _ThreadingTCPServer((host, 0), _FTPHandler)
+        self._server.mock = self
+        self.port = self._server.server_address[1]
+        #: the url to use in downModis
+        self.url = 'ftp://{ho}:{po}'.format(ho=host, po=self.port)
+
+
+def _client(protocol, server, archive, folder, workers, token=None):
+    """Return the downModis object of a benchmark
+
+       :param str protocol: http, ftp or async
+       :param server: the MockHTTPServer or MockFTPServer object
+       :param archive: the MockArchive object
+       :param str folder: the destination folder
+       :param int workers: the number of parallel downloads
+       :param str token: use the token instead of user and password
+    """
+    options = dict(url=server.url, path=archive.path,
+                   product=archive.product, today=archive.days[0],
+                   delta=len(archive.days), checkgdal=False, checksum=True,
+                   timeout=30)
+    if token:
+        options['token'] = token
+    else:
+        options.update(user=server.user, password=server.password)
+    if protocol == 'async':
+        from .downmodis_async import AsyncDownModis
+        modis = AsyncDownModis(folder, concurrency=workers, **options)
+    else:
+        modis = downModis(folder, workers=workers, **options)
+    modis.session.authhosts.add(getattr(server, 'authhost', server.host))
+    return modis
+
+
+def benchmark(archive, protocols=('http', 'ftp'), workers=(1, 4, 8),
+              latency=0.02, bandwidth=None, auth='basic'):
+    """Measure connect, getFilesList and downloadsAllDay of downModis with
+       the local servers, for every protocol and number of workers
+
+       :param archive: the MockArchive object to serve
+       :param list protocols: the protocols to test: http, ftp and async,
+                              async uses AsyncDownModis with HTTP
+       :param list workers: the numbers of parallel downloads to test
+       :param float latency: seconds waited by the servers before every
+                             response
+       :param int bandwidth: bytes per second of each download, None == no
+                             limit
+       :param str auth: the authentication of the HTTP server: basic,
+                        bearer or none
+
+       :return: a list of dictionaries with the results
+    """
+    results = []
+    for protocol in protocols:
+        if protocol == 'ftp':
+            server = MockFTPServer(archive, latency, bandwidth)
+        else:
+            server = MockHTTPServer(archive, latency, bandwidth,
+                                    auth=auth != 'none')
+        token = server.token if auth == 'bearer' and protocol != 'ftp' \
+            else None
+        with server:
+            for nwork in workers:
+                folder = tempfile.mkdtemp(prefix='pymodisbench')
+                try:
+                    modis = _client(protocol, server, archive, folder, nwork,
+                                    token)
+                    start = time.time()
+                    modis.connect()
+                    connect = time.time() - start
+                    days = modis.getListDays()
+                    start = time.time()
+                    for day in days:
+                        modis.getFilesList(day)
+                    listing = (time.time() - start) / max(1, len(days))
+                    start = time.time()
+                    summary = modis.downloadsAllDay()
+                    seconds = time.time() - start
+                finally:
+                    shutil.rmtree(folder, ignore_errors=True)
+                files = summary['files'] - summary['failed']
+                results.append({
+                    'protocol': protocol, 'workers': nwork, 'days': len(days),
+                    'connect': connect, 'listing': listing,
+                    'seconds': seconds, 'files': files,
+                    'failed': summary['failed'],
+                    'bytes': summary['bytes'],
+                    'filesrate': files / seconds if seconds else 0.0,
+                    'bytesrate': summary['bytes'] / seconds if seconds
+                    else 0.0})
+    return results
+
+
+def printResults(results, out=sys.stdout):
+    """Print the results of benchmark as a table
+
+       :param list results: the results returned by benchmark
+       :param out: the file where the table is written
+    """
+    out.write('{:<9}{:>8}{:>12}{:>13}{:>10}{:>8}{:>10}{:>10}\n'.format(
+        'protocol', 'workers', 'connect s', 'listing ms', 'total s',
+        'files', 'files/s', 'MB/s'))
+    for res in results:
+        out.write('{:<9}{:>8}{:>12.3f}{:>13.1f}{:>10.2f}{:>8}{:>10.1f}'
+                  '{:>10.2f}\n'.format(res['protocol'], res['workers'],
+                                       res['connect'], res['listing'] * 1000,
+                                       res['seconds'], res['files'],
+                                       res['filesrate'],
+                                       res['bytesrate'] / 1048576.0))
+
+
+def _countTiles(listfiles, prod, tiles, jpeg=False):
+    """The selection of modisHtmlParser.get_tiles before the names were
+       parsed once, every name is split and searched in the list of tiles.
+       It is the reference of benchmarkListing
+
+       :param list listfiles: the names of the files in the directory
+       :param str prod: the code of the product
+       :param list tiles: the list of tiles to consider
+       :param bool jpeg: True to also return the jpeg files
+    """
+    finalList = []
+    for i in listfiles:
+        name = i.split('.')
+        if not name.count(prod):
+            continue
+        if not tiles and not (name.count('jpg') or name.count('BROWSE')):
+            finalList.append(i)
+        if tiles:
+            if tiles.count(name[3]) == 1 and jpeg:
+                finalList.append(i)
+            elif tiles.count(name[2]) == 1:
+                finalList.append(i)
+    return finalList
+
+
+def _countFiles(listfiles, tiles, jpeg=False):
+    """The filter of the FTP listings before the names were parsed once,
+       it is the reference of benchmarkListing
+
+       :param list listfiles: the names of the files in the directory
+       :param list tiles: the list of tiles to consider
+       :param bool jpeg: True to also return the jpeg files
+    """
+    finalList = []
+    for i in listfiles:
+        name = i.split('.')
+        if not tiles and not (name.count('jpg') or name.count('BROWSE')):
+            finalList.append(i)
+        if tiles:
+            if tiles.count(name[3]) == 1 and jpeg:
+                finalList.append(i)
+            elif tiles.count(name[2]) == 1:
+                finalList.append(i)
+    return finalList
+
+
+def _timeit(func, repeat):
+    """Return the mean seconds of a function and its last result, the
+       cache of the parsed names is cleared before every call
+
+       :param func: the function to measure, without arguments
+       :param int repeat: the number of calls
+    """
+    result = func()
+    elapsed = 0.0
+    for i in range(repeat):
+        GranuleName.parse.cache_clear()
+        start = time.perf_counter()
+        result = func()
+        elapsed += time.perf_counter() - start
+    return elapsed / repeat, result
+
+
+def benchmarkListing(tiles=460, selected=(460, 3), product='MOD11A1.061',
+                     repeat=50):
+    """Measure the selection of the files of a day listing, the HDF, XML
+       and two browse JPG files of each tile. The current filters
+       (modisHtmlParser.get_tiles and filterFiles) are compared with the
+       previous ones, which split every name and search it in the list of
+       tiles
+
+       :param int tiles: the number of tiles of the listing
+       :param list selected: the numbers of tiles to select
+       :param str product: the product with the version
+       :param int repeat: the number of measures of each filter
+
+       :return: a list of dictionaries with the results
+    """
+    code, version = product.split('.')
+    alltiles = ['h{h:02d}v{v:02d}'.format(h=i // 18, v=i % 18)
+                for i in range(int(tiles))]
+    names = []
+    for tile in alltiles:
+        name = '{co}.A2020031.{ti}.{ve}.2021005211452'.format(
+            co=code, ti=tile, ve=version)
+        names.extend([name + '.hdf', name + '.hdf.xml',
+                      'BROWSE.{na}.1.jpg'.format(na=name),
+                      'BROWSE.{na}.2.jpg'.format(na=name)])
+    parser = modisHtmlParser(None, fileids=names)
+    results = []
+    for num in selected:
+        tilelist = alltiles[:int(num)]
+        tileset = frozenset(tilelist)
+        tests = (('HTTP get_tiles',
+                  lambda: _countTiles(names, code, tilelist, jpeg=True),
+                  lambda: parser.get_tiles(code, tileset, jpeg=True)),
+                 ('FTP filter',
+                  lambda: _countFiles(names, tilelist, jpeg=True),
+                  lambda: filterFiles(names, tileset, jpeg=True)))
+        for operation, before, after in tests:
+            beforetime, beforefiles = _timeit(before, repeat)
+            aftertime, afterfiles = _timeit(after, repeat)
+            results.append({
+                'operation': operation, 'names': len(names),
+                'tiles': len(tilelist), 'before': beforetime,
+                'after': aftertime, 'files': len(afterfiles),
+                'same': sorted(beforefiles) == sorted(afterfiles)})
+    return results
+
+
+def printListing(results, out=sys.stdout):
+    """Print the results of benchmarkListing as a table
+
+       :param list results: the results returned by benchmarkListing
+       :param out: the file where the table is written
+    """
+    out.write('{:<16}{:>7}{:>7}{:>13}{:>12}{:>8}{:>6}\n'.format(
+        'operation', 'names', 'tiles', 'before ms', 'after ms', 'files',
+        'same'))
+    for res in results:
+        out.write('{:<16}{:>7}{:>7}{:>13.3f}{:>12.3f}{:>8}{:>6}\n'.format(
+            res['operation'], res['names'], res['tiles'],
+            res['before'] * 1000, res['after'] * 1000, res['files'],
+            'yes' if res['same'] else 'no'))
+
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = OptionParser(usage='usage: python -m pymodis.benchmodis '
+                          '[options]', description='Measure the download '
+                          'performance of pyModis with local servers')
+    parser.add_option('-d', '--days', dest='days', type='int', default=5,
+                      help='number of days of the archive [default=%default]')
+    parser.add_option('-t', '--tiles', dest='tiles', type='int', default=4,
+                      help='number of tiles of each day [default=%default]')
+    parser.add_option('-s', '--size', dest='size', type='int',
+                      default=1048576, help='size of the HDF files in bytes '
+                      '[default=%default]')
+    parser.add_option('-l', '--latency', dest='latency', type='float',
+                      default=0.02, help='seconds waited by the servers '
+                      'before every response [default=%default]')
+    parser.add_option('-b', '--bandwidth', dest='bandwidth', type='int',
+                      default=None, help='bytes per second of each '
+                      'download [default=no limit]')
+    parser.add_option('-w', '--workers', dest='workers', default='1,4,8',
+                      help='numbers of parallel downloads to test, separated'
+                      ' by comma [default=%default]')
+    parser.add_option('-p', '--protocols', dest='protocols',
+                      default='http,ftp', help='protocols to test '
+                      '(http, ftp, async) separated by comma '
+                      '[default=%default]')
+    parser.add_option('-a', '--auth', dest='auth', default='basic',
+                      choices=['basic', 'bearer', 'none'],
+                      help='authentication of the HTTP server: basic, '
+                      'bearer or none [default=%default]')
+    parser.add_option('-j', '--json', dest='json', default=None,
+                      help='write the results to this JSON file')
+    parser.add_option('--listing', dest='listing', default=None,
+                      help='measure only the filters of the listings, '
+                      'with the numbers of tiles to select separated by '
+                      'comma; --tiles is the number of tiles of the '
+                      'listing, 460 if it is not changed')
+    (options, args) = parser.parse_args()
+    if options.listing:
+        tiles = options.tiles if options.tiles != 4 else 460
+        results = benchmarkListing(tiles, [int(num) for num in
+                                           options.listing.split(',')])
+        printListing(results)
+        if options.json:
+            with open(options.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+    # downModis logs to its destination folder only without other handlers
+    logging.basicConfig(level=logging.WARNING)
+    archive = MockArchive(days=options.days, tiles=options.tiles,
+                          size=options.size)
+    try:
+        results = benchmark(archive, options.protocols.split(','),
+                            [int(w) for w in options.workers.split(',')],
+                            options.latency, options.bandwidth, options.auth)
+    finally:
+        archive.close()
+    printResults(results)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
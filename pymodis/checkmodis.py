@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+#  class to find the missing MODIS files in a folder
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to find the missing days and tiles of a MODIS product in a
+folder. The folder is scanned once and the files are stored in a boolean
+matrix with a row for each day of the calendar of the product and a column
+for each tile
+
+Classes:
+
+* :class:`GapAnalysis`
+
+Functions:
+
+* :func:`compositeCalendar`
+* :func:`compositeOffset`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+from __future__ import division
+
+from collections import Counter
+from datetime import date
+import os
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('Numpy library not found, please install it')
+
+from .granulemodis import splitNames
+
+
+def _toDatetime64(day):
+    """Return a numpy.datetime64 day from a date or a string
+
+       :param day: a datetime.date or a string in format YYYY-MM-DD
+    """
+    if isinstance(day, date):
+        day = day.isoformat()
+    return np.datetime64(day, 'D')
+
+
+def compositeCalendar(start, end, period=1, offset=1):
+    """Return the days of the data of a product between two days. The
+       composites of 8 and 16 days start again on the first of January, the
+       last one of the year is shorter
+
+       :param start: the first day, a datetime.date or a string in format
+                     YYYY-MM-DD
+       :param end: the last day, a datetime.date or a string in format
+                   YYYY-MM-DD
+       :param int period: the number of days of the composite, 1 for daily
+                          products
+       :param int offset: the day of the year of the first composite, for
+                          example 9 for the 16 days products of Aqua
+
+       :return: a sorted numpy array of datetime64 days
+    """
+    start = _toDatetime64(start)
+    end = _toDatetime64(end)
+    first = start.astype('datetime64[Y]').astype(int) + 1970
+    last = end.astype('datetime64[Y]').astype(int) + 1970
+    years = np.arange(first, last + 1)
+    doys = np.arange(offset - 1, 366, period)
+    # all the composites of the years, the ones of the next year are removed
+    newyear = (years - 1970).astype('datetime64[Y]')
+    days = (newyear.astype('datetime64[D]')[:, None] + doys[None, :]).ravel()
+    days = days[days.astype('datetime64[Y]') == np.repeat(newyear, len(doys))]
+    return days[(days >= start) & (days <= end)]
+
+
+def compositeOffset(doys, period):
+    """Return the day of the year of the first composite, the most common
+       one of the days of the files
+
+       :param doys: the days of the year of the files
+       :param int period: the number of days of the composite
+
+       :return: the day of the year of the first composite, 1 if doys is
+                empty
+    """
+    doys = np.asarray(doys, dtype=int)
+    if period <= 1 or not len(doys):
+        return 1
+    return int(np.bincount((doys - 1) % period).argmax()) + 1
+
+
+class GapAnalysis:
+    """Find the missing days and tiles of a product in a folder, the folder
+       is scanned once when the object is created
+
+       :param str folder: the folder with the HDF files
+       :param str product: the product, like MOD11A1 or MOD11A1.006
+       :param tiles: the tiles to check, a list or a string separated by
+                     comma; None for the tiles found in the folder
+       :param str collection: the collection to check, like 006; None for
+                              all the collections
+       :param start: the first day to check, a datetime.date or a string in
+                     format YYYY-MM-DD; None for the first of January of the
+                     first year in the folder
+       :param end: the last day to check, a datetime.date or a string in
+                   format YYYY-MM-DD; None for the last day of the last year
+                   in the folder
+       :param int period: the number of days of the composite, 1 for daily
+                          products, 8 or 16 for the composites
+       :param int offset: the day of the year of the first composite; None
+                          to find it from the files
+    """
+    def __init__(self, folder, product, tiles=None, collection=None,
+                 start=None, end=None, period=1, offset=None):
+        """Function to initialize the object"""
+        if '.' in product:
+            product, collection = product.split('.')[:2]
+        self.product = product
+        self.collection = collection
+        if isinstance(tiles, str):
+            tiles = [tile.strip() for tile in tiles.split(',') if tile.strip()]
+        self.period = max(1, int(period))
+        years, doys, filetiles, collections = self._scan(folder, tiles)
+        if tiles is None:
+            tiles = sorted(set(filetiles))
+        #: the checked tiles, the columns of the matrix
+        self.tiles = list(tiles)
+        if self.collection is None:
+            found = Counter(collections)
+            self.collection = found.most_common(1)[0][0] if found else '*'
+        if offset is None:
+            offset = compositeOffset(doys, self.period)
+        self.offset = offset
+        if start is None and len(years):
+            start = date(int(years.min()), 1, 1)
+        if end is None and len(years):
+            end = date(int(years.max()), 12, 31)
+        if start is None or end is None:
+            raise ValueError("There are no files of {pro} in {fold}, set "
+                             "the first and the last day".format(
+                                 pro=product, fold=folder))
+        #: the days of the calendar, the rows of the matrix
+        self.days = compositeCalendar(start, end, self.period, offset)
+        #: the boolean matrix of the files found, days x tiles
+        self.present = np.zeros((len(self.days), len(self.tiles)), dtype=bool)
+        if not len(years) or not len(self.days):
+            return
+        filedays = (years - 1970).astype('datetime64[Y]').astype(
+            'datetime64[D]') + (doys - 1)
+        column = dict((tile, i) for i, tile in enumerate(self.tiles))
+        cols = np.array([column.get(tile, -1) for tile in filetiles])
+        rows = np.searchsorted(self.days, filedays)
+        # the files of the checked tiles and of the days of the calendar
+        valid = (cols >= 0) & (rows < len(self.days))
+        valid[valid] &= self.days[rows[valid]] == filedays[valid]
+        self.present[rows[valid], cols[valid]] = True
+
+    def _scan(self, folder, tiles=None):
+        """Return the parts of the names of the HDF files of the product,
+           the names are split all at once, see granulemodis.splitNames
+
+           :param str folder: the folder with the HDF files
+           :param list tiles: the tiles to keep, None for all the tiles
+
+           :return: two numpy arrays with the years and the days of the
+                    year, two lists with the tiles and the collections
+        """
+        tileset = frozenset(tiles) if tiles is not None else None
+        collection = self.collection
+        parts = [part for part in splitNames(os.listdir(folder))
+                 if part[1] == self.product and part[9] == 'hdf' and
+                 not part[0] and (not collection or part[7] == collection)
+                 and (tileset is None or part[4] in tileset)]
+        if not parts:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), [], []
+        columns = list(zip(*parts))
+        return (np.fromiter(map(int, columns[2]), int, len(parts)),
+                np.fromiter(map(int, columns[3]), int, len(parts)),
+                columns[4], columns[7])
+
+    def missing(self):
+        """Return the missing files
+
+           :return: a list of tuples (datetime.date, tile) sorted by day and
+                    tile
+        """
+        rows, cols = np.nonzero(~self.present)
+        days = self.days[rows].tolist()
+        return [(day, self.tiles[col])
+                for day, col in zip(days, cols.tolist())]
+
+    def missingDays(self):
+        """Return the days without any file
+
+           :return: a list of datetime.date objects
+        """
+        return self.days[~self.present.any(axis=1)].tolist()
+
+    def names(self):
+        """Return the names of the missing files with * as production
+           date, like MOD11A1.A2020031.h18v04.006.*.hdf*, the format read
+           by modis_download_from_list
+
+           :return: a list of strings
+        """
+        return ["{pro}.A{dat}.{tile}.{col}.*.hdf*".format(
+            pro=self.product, dat=day.strftime('%Y%j'), tile=tile,
+            col=self.collection) for day, tile in self.missing()]
+
+    def write(self, output):
+        """Write the names of the missing files, one for each line
+
+           :param output: a file object or the name of the file
+        """
+        lines = ''.join(name + '\n' for name in self.names())
+        if hasattr(output, 'write'):
+            output.write(lines)
+        else:
+            with open(output, 'w') as f:
+                f.write(lines)
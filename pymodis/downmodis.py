@@ -26,6 +26,17 @@ It supports both FTP and HTTP repositories
 
 Classes:
 
+* :class:`RetryPolicy`
+* :class:`ListingCache`
+* :class:`DownloadState`
+* :class:`Cksum`
+* :class:`FTPPool`
+* :class:`RateLimiter`
+* :class:`DiskSpace`
+* :class:`DiskSpaceError`
+* :class:`DownloadMetrics`
+* :class:`GranuleSearch`
+* :class:`DateIndex`
 * :class:`modisHtmlParser`
 * :class:`downModis`
 
@@ -34,6 +45,10 @@ Functions:
 * :func:`urljoin`
 * :func:`getNewerVersion`
 * :func:`str2date`
+* :func:`getDataFiles`
+* :func:`preallocate`
+* :func:`yearlyWindows`
+* :func:`filterFiles`
 
 """
 
@@ -43,26 +58,42 @@ from builtins import dict
 
 from datetime import date
 from datetime import timedelta
+from xml.etree import ElementTree
+import bisect
+import contextlib
+import contextvars
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import io
 import os
-import sys
 import glob
+import json
 import logging
+import random
+import shutil
 import socket
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from ftplib import FTP
 import ftplib
 
 import requests
+from requests.adapters import HTTPAdapter
 # urllib in python 2 and 3
 try:
     from future.standard_library import install_aliases
     install_aliases()
 except ImportError:
     raise ImportError("Future library not found, please install it")
-from urllib.request import urlopen
 import urllib.request
-import urllib.error
 from base64 import b64encode
-from html.parser import HTMLParser
+import html
 import re
 import netrc
 import warnings
@@ -78,6 +109,7 @@ except ImportError:
         URLPARSE = False
         warnings.warn('urlparse not found, it is not possible to use'
                       ' netrc file', ImportError)
+from .granulemodis import GranuleName
 global GDAL
 
 try:
@@ -120,6 +152,10 @@ def getNewerVersion(oldFile, newFile):
 
        :return: the name of newer file
     """
+    old = GranuleName.parse(oldFile)
+    new = GranuleName.parse(newFile)
+    if old and new:
+        return oldFile if old.isNewer(new) else newFile
     # get the processing date (YYYYDDDHHMMSS) from the file strings
     if oldFile.split('.')[4] > newFile.split('.')[4]:
         return oldFile
@@ -142,6 +178,442 @@ def str2date(datestring):
     return date(int(stringSplit[0]), int(stringSplit[1]), int(stringSplit[2]))
 
 
+def getDataFiles(content, name=None):
+    """Return the values of the DataFileContainer element of the XML
+       metadata of a MODIS granule, as done by parseModis.retDataFiles but
+       reading the XML content directly
+
+       :param content: the content of the XML file
+       :param str name: the name of the HDF file, used to select the right
+                        DataFileContainer element
+
+       :return: a dictionary, empty if the element is not found
+    """
+    tree = ElementTree.fromstring(content)
+    for container in tree.iter('DataFileContainer'):
+        values = dict()
+        for i in container.iter():
+            if i.text and i.text.strip() != '':
+                values[i.tag] = i.text.strip()
+        if not name or values.get('DistributedFileName', name) == name:
+            return values
+    return dict()
+
+
+class Cksum:
+    """A class to compute incrementally the POSIX cksum checksum, used in
+       the XML metadata of MODIS granules. The not reflected CRC is obtained
+       from zlib.crc32 by reversing the bits of every byte
+    """
+    # table to reverse the bits of a byte
+    _REVERSE = bytes(bytearray(int('{0:08b}'.format(i)[::-1], 2)
+                               for i in range(256)))
+
+    def __init__(self):
+        """Function to initialize the object"""
+        # zlib.crc32 value corresponding to an empty CRC register
+        self.crc = 0xFFFFFFFF
+        self.length = 0
+
+    def update(self, data):
+        """Add data to the checksum
+
+           :param bytes data: the data to add
+        """
+        self.crc = zlib.crc32(bytes(data).translate(self._REVERSE), self.crc)
+        self.length += len(data)
+
+    def value(self):
+        """Return the checksum as integer"""
+        # the length of the data is added to the CRC, less significant
+        # byte first
+        num = self.length
+        tail = bytearray()
+        while num:
+            tail.append(num & 0xFF)
+            num >>= 8
+        crc = zlib.crc32(bytes(tail).translate(self._REVERSE), self.crc)
+        crc = int('{0:032b}'.format(crc ^ 0xFFFFFFFF)[::-1], 2)
+        return ~crc & 0xFFFFFFFF
+
+    def hexdigest(self):
+        """Return the checksum as string, in decimal notation like cksum"""
+        return str(self.value())
+
+
+class RetryPolicy:
+    """A class to retry the network operations with an exponential backoff,
+       it replaces the unlimited recursive retries
+
+       :param int attempts: maximum number of attempts for each operation,
+                            a negative value means unlimited attempts
+       :param float backoff: seconds to wait after the first failure
+       :param float factor: multiplier of the waiting time after each failure
+       :param float maxwait: maximum number of seconds between two attempts
+       :param float jitter: fraction of the waiting time randomly added or
+                            removed, to avoid synchronized retries
+       :param float deadline: maximum number of seconds spent on a single
+                              operation, None for no limit
+       :param list statuses: HTTP status codes worth a new attempt
+    """
+    #: the errors considered temporary by default
+    ERRORS = (IOError, OSError, EOFError, ftplib.error_temp,
+              ftplib.error_reply, ftplib.error_proto)
+    #: the errors of the local filesystem, they are not retried
+    FSERRNOS = frozenset([errno.ENOSPC, errno.EDQUOT, errno.EACCES,
+                          errno.EPERM, errno.EROFS, errno.EISDIR,
+                          errno.ENOTDIR, errno.EFBIG])
+
+    def __init__(self, attempts=10, backoff=1, factor=2, maxwait=120,
+                 jitter=0.1, deadline=300,
+                 statuses=(408, 429, 500, 502, 503, 504)):
+        """Function to initialize the object"""
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.maxwait = maxwait
+        self.jitter = jitter
+        self.deadline = deadline
+        self.statuses = set(statuses)
+        # total number of attempts, retries and failed operations
+        self.total = 0
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        # attempts of the last operation, for each thread or asyncio task
+        self._attempts = contextvars.ContextVar('attempts', default=0)
+
+    def wait(self, attempt):
+        """Return the seconds to wait after a failed attempt
+
+           :param int attempt: the number of the failed attempt
+        """
+        delay = min(self.maxwait, self.backoff * self.factor ** (attempt - 1))
+        return max(0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def retriable(self, error):
+        """Return True if the error is worth a new attempt
+
+           :param error: the exception raised by the operation
+        """
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+        if status:
+            return status in self.statuses
+        # a full disk or a forbidden folder will not change
+        if isinstance(error, OSError) and error.errno in self.FSERRNOS:
+            return False
+        return True
+
+    def check(self, response):
+        """Raise an HTTPError if the status of the response is worth a new
+           attempt
+
+           :param response: a requests Response object
+        """
+        if response.status_code in self.statuses:
+            response.raise_for_status()
+
+    def lastAttempts(self):
+        """Return the number of attempts of the last operation executed by
+           the current thread or asyncio task"""
+        return self._attempts.get()
+
+    def call(self, func, args=(), kwargs=None, attempts=None, errors=None,
+             what=None):
+        """Execute a function until it succeeds or the policy gives up
+
+           :param func: the function to execute
+           :param tuple args: the positional arguments of the function
+           :param dict kwargs: the keyword arguments of the function
+           :param int attempts: overwrite the maximum number of attempts
+           :param tuple errors: the exceptions to retry, by default the
+                                network and temporary FTP errors
+           :param str what: description of the operation for the log
+
+           :return: the value returned by the function, the last error is
+                    raised if all the attempts failed
+        """
+        if kwargs is None:
+            kwargs = {}
+        if attempts is None:
+            attempts = self.attempts
+        if errors is None:
+            errors = self.ERRORS
+        if what is None:
+            what = getattr(func, '__name__', str(func))
+        start = time.time()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.started(attempt)
+            try:
+                return func(*args, **kwargs)
+            except errors as e:
+                time.sleep(self.failed(e, attempt, attempts, start, what))
+
+    def started(self, attempt):
+        """Count a new attempt of an operation
+
+           :param int attempt: the number of the attempt
+        """
+        self._attempts.set(attempt)
+        with self._lock:
+            self.total += 1
+
+    def failed(self, error, attempt, attempts, start, what):
+        """Count a failed attempt and return the seconds to wait before the
+           next one, the error is raised again if the policy gives up
+
+           :param error: the exception raised by the operation
+           :param int attempt: the number of the failed attempt
+           :param int attempts: the maximum number of attempts
+           :param float start: the time of the first attempt
+           :param str what: description of the operation for the log
+        """
+        delay = self.wait(attempt)
+        if not self.retriable(error) or \
+                (attempts >= 0 and attempt >= attempts) or \
+                (self.deadline is not None and
+                 time.time() - start + delay > self.deadline):
+            with self._lock:
+                self.failures += 1
+            logging.error("{what} failed after {num} attempts, the "
+                          "last error was '{err}'".format(
+                              what=what, num=attempt, err=error))
+            raise error
+        logging.warning("Attempt {num} of {what} failed with error "
+                        "'{err}', retrying in {sec:.1f} "
+                        "seconds".format(num=attempt, what=what,
+                                         err=error, sec=delay))
+        with self._lock:
+            self.retries += 1
+        return delay
+
+
+class ListingCache:
+    """A class to store on disk the directory listings of the HTTP server.
+       The listings are revalidated with the server using ETag and
+       Last-Modified headers after a time to live, which is longer for the
+       days far in the past since their listings hardly change
+
+       :param str filename: the JSON file where the cache is stored
+       :param int ttl: seconds before the listings of recent days and of
+                       the product directory have to be revalidated
+       :param int oldttl: seconds before the listings of old days have to
+                          be revalidated
+       :param int oldage: the age in days after which a day is old
+    """
+    def __init__(self, filename, ttl=3600, oldttl=2592000, oldage=30):
+        """Function to initialize the object"""
+        self.filename = filename
+        self.ttl = ttl
+        self.oldttl = oldttl
+        self.oldage = oldage
+        self.entries = {}
+        self.changed = False
+        self._lock = threading.Lock()
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logging.warning("The listing cache {name} is not valid, it "
+                                "will be rebuilt".format(name=self.filename))
+
+    def get(self, url):
+        """Return the cached entry of an url or None
+
+           :param str url: the url of the listing
+        """
+        with self._lock:
+            return self.entries.get(url)
+
+    def isFresh(self, entry, day=None):
+        """Return True if the entry can be used without asking the server
+
+           :param dict entry: the cached entry
+           :param str day: the day of the listing in format YYYY.MM.DD,
+                           None for the product directory
+        """
+        ttl = self.ttl
+        if day:
+            try:
+                age = date.today() - str2date(day)
+                if age.days > self.oldage:
+                    ttl = self.oldttl
+            except (ValueError, IndexError, UnboundLocalError):
+                pass
+        return time.time() - entry['time'] < ttl
+
+    def put(self, url, links, etag=None, modified=None):
+        """Store the listing of an url
+
+           :param str url: the url of the listing
+           :param list links: the links contained in the listing
+           :param str etag: the ETag header returned by the server
+           :param str modified: the Last-Modified header returned by the
+                                server
+        """
+        with self._lock:
+            self.entries[url] = {'links': links, 'etag': etag,
+                                 'modified': modified, 'time': time.time()}
+            self.changed = True
+
+    def touch(self, url):
+        """Mark the listing of an url as just revalidated
+
+           :param str url: the url of the listing
+        """
+        with self._lock:
+            self.entries[url]['time'] = time.time()
+            self.changed = True
+
+    def save(self):
+        """Write the cache to disk, if it changed"""
+        with self._lock:
+            if not self.changed:
+                return
+            tmpname = self.filename + '.tmp'
+            with open(tmpname, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmpname, self.filename)
+            self.changed = False
+
+
+class DownloadState:
+    """A class to store in a SQLite database the state of the downloaded
+       granules, so the files already downloaded are known without
+       scanning the destination folder
+
+       :param str filename: the SQLite database file
+    """
+    #: status of the files completely downloaded
+    DONE = 'done'
+    #: status of the files found in the folder when the database was created
+    PRESENT = 'present'
+    #: status of the files with a download in progress
+    PARTIAL = 'partial'
+    #: status of the files whose download failed
+    FAILED = 'failed'
+
+    def __init__(self, filename):
+        """Function to initialize the object"""
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS granules ("
+                          "name TEXT PRIMARY KEY, size INTEGER, "
+                          "checksum TEXT, status TEXT, updated REAL)")
+        self.conn.commit()
+        # the names of the complete files, kept in memory
+        self.complete = set(row[0] for row in self.conn.execute(
+            "SELECT name FROM granules WHERE status IN (?, ?)",
+            (self.DONE, self.PRESENT)))
+
+    def isEmpty(self):
+        """Return True if the database does not contain any file"""
+        with self._lock:
+            cur = self.conn.execute("SELECT COUNT(*) FROM granules")
+            return cur.fetchone()[0] == 0
+
+    def isComplete(self, name):
+        """Return True if the file is completely downloaded
+
+           :param str name: the name of the file
+        """
+        return name in self.complete
+
+    def get(self, name):
+        """Return a dictionary with size, checksum and status of a file or
+           None if it is not in the database
+
+           :param str name: the name of the file
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT size, checksum, status FROM "
+                                    "granules WHERE name = ?",
+                                    (name,)).fetchone()
+        if row is None:
+            return None
+        return {'size': row[0], 'checksum': row[1], 'status': row[2]}
+
+    def _set(self, name, status, size=None, checksum=None):
+        """Write the state of a file
+
+           :param str name: the name of the file
+           :param str status: the status of the file
+           :param int size: the size of the file in bytes
+           :param str checksum: the checksum of the file
+        """
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO granules (name, size, "
+                              "checksum, status, updated) VALUES "
+                              "(?, ?, ?, ?, ?)", (name, size, checksum,
+                                                  status, time.time()))
+            self.conn.commit()
+            if status in (self.DONE, self.PRESENT):
+                self.complete.add(name)
+            else:
+                self.complete.discard(name)
+
+    def start(self, name):
+        """Mark a file as in download
+
+           :param str name: the name of the file
+        """
+        self._set(name, self.PARTIAL)
+
+    def done(self, name, size, checksum=None):
+        """Mark a file as completely downloaded
+
+           :param str name: the name of the file
+           :param int size: the size of the file in bytes
+           :param str checksum: the checksum of the file
+        """
+        self._set(name, self.DONE, size, checksum)
+
+    def failed(self, name):
+        """Mark a file as failed
+
+           :param str name: the name of the file
+        """
+        self._set(name, self.FAILED)
+
+    def remove(self, name):
+        """Remove a file from the database
+
+           :param str name: the name of the file
+        """
+        with self._lock:
+            self.conn.execute("DELETE FROM granules WHERE name = ?", (name,))
+            self.conn.commit()
+            self.complete.discard(name)
+
+    def importFolder(self, folder):
+        """Add the files already present in a folder to the database
+
+           :param str folder: the folder to scan
+        """
+        rows = []
+        for f in os.listdir(folder):
+            path = os.path.join(folder, f)
+            if os.path.isfile(path) and not f.endswith('.part'):
+                rows.append((f, os.path.getsize(path), None, self.PRESENT,
+                             time.time()))
+        with self._lock:
+            self.conn.executemany("INSERT OR IGNORE INTO granules (name, "
+                                  "size, checksum, status, updated) VALUES "
+                                  "(?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+            self.complete.update(row[0] for row in rows)
+
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self.conn.close()
+
+
 class ModisHTTPRedirectHandler(urllib.request.HTTPRedirectHandler):
     """Class to return 302 error"""
     def http_error_302(self, req, fp, code, msg, headers):
@@ -150,30 +622,837 @@ class ModisHTTPRedirectHandler(urllib.request.HTTPRedirectHandler):
                                                                  headers)
 
 
-class modisHtmlParser(HTMLParser):
-    """A class to parse HTML
+class ModisSession(requests.Session):
+    """A requests Session with a pool of keep-alive connections, it keeps
+       the authentication header when redirected between the data server
+       and the NASA Earthdata authentication server, and stores the cookies
+       set by the authentication so it is done only once
+
+       :param dict headers: the headers to send with every request
+       :param list authhosts: the hosts allowed to receive the
+                              authentication header on redirects
+       :param int poolsize: the maximum number of connections to keep
+                            open for each host
+    """
+    def __init__(self, headers=None, authhosts=None, poolsize=10):
+        """Function to initialize the object"""
+        requests.Session.__init__(self)
+        adapter = HTTPAdapter(pool_connections=poolsize,
+                              pool_maxsize=poolsize)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        if headers:
+            self.headers.update(headers)
+        self.authhosts = set(['urs.earthdata.nasa.gov'])
+        if authhosts:
+            self.authhosts.update(authhosts)
+
+    def should_strip_auth(self, old_url, new_url):
+        """Keep the authentication header on redirects between the
+           authentication hosts"""
+        if (urlparse(old_url).hostname in self.authhosts and
+                urlparse(new_url).hostname in self.authhosts):
+            return False
+        return requests.Session.should_strip_auth(self, old_url, new_url)
+
+
+class FTPPool:
+    """A pool of logged-in FTP connections, each one is inside its own
+       directory so several files can be downloaded at the same time.
+       A connection raising a network or protocol error is closed, a new
+       one is opened when it is required again. After the errors of the
+       local files, like a full disk, the connection returns to the pool
+
+       :param str host: the address of the FTP server, with the port if
+                        it is not the default one, like host:2121
+       :param str user: the user name
+       :param str password: the password
+       :param str path: the directory of the product
+       :param int size: the maximum number of open connections
+       :param int timeout: timeout value of the connections (seconds)
+    """
+    #: the errors closing a connection, a connection left in a wrong
+    #: state by another error raises one of them at the next command
+    ERRORS = (socket.timeout, ConnectionError, EOFError, ftplib.error_reply,
+              ftplib.error_temp, ftplib.error_proto)
+
+    def __init__(self, host, user, password, path, size=1, timeout=30):
+        """Function to initialize the object"""
+        self.host = host
+        self.user = user
+        self.password = password
+        self.path = path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        # number of logins done
+        self.logins = 0
+        # idle connections with their current directory
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """Open a new connection and enter in the directory of the product"""
+        # the host could contain the port, like host:2121
+        host, _, port = self.host.partition(':')
+        ftp = FTP(timeout=self.timeout)
+        try:
+            ftp.connect(host, int(port) if port else 0)
+            ftp.login(self.user, self.password)
+            ftp.cwd(self.path)
+        except ftplib.all_errors:
+            ftp.close()
+            raise
+        with self._lock:
+            self.logins += 1
+        return ftp
+
+    def _get(self, day):
+        """Return an idle connection and its directory, preferring one
+           already inside the directory of the day
+
+           :param str day: the directory of the day
+        """
+        with self._lock:
+            for i, (ftp, cwd) in enumerate(self._idle):
+                if cwd == day:
+                    return self._idle.pop(i)
+            if self._idle:
+                return self._idle.pop()
+        return self._open(), None
+
+    @contextlib.contextmanager
+    def connection(self, day=None):
+        """Return a connection inside the directory of a day, waiting if
+           all the connections are in use
+
+           :param str day: the directory of the day in format YYYY.MM.DD,
+                           None for the directory of the product
+        """
+        with self._slots:
+            ftp, cwd = self._get(day)
+            dead = False
+            try:
+                if cwd != day and cwd:
+                    ftp.cwd('..')
+                    cwd = None
+                if cwd != day:
+                    ftp.cwd(day)
+                    cwd = day
+                yield ftp
+            except self.ERRORS:
+                dead = True
+                raise
+            finally:
+                if dead:
+                    logging.warning("FTP connection lost, it will be "
+                                    "reopened")
+                    ftp.close()
+                else:
+                    with self._lock:
+                        self._idle.append((ftp, cwd))
+
+    def close(self):
+        """Close all the idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ftp, cwd in idle:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+class RateLimiter:
+    """A token bucket shared by all the threads of the downloads, used to
+       limit the number of bytes or requests per second
 
-       :param fh: content of http request
+       :param float rate: the number of tokens added each second
+       :param float burst: the maximum number of tokens stored, None ==
+                           the tokens of one second
     """
-    def __init__(self, fh):
+    def __init__(self, rate, burst=None):
         """Function to initialize the object"""
-        HTMLParser.__init__(self)
-        self.fileids = []
-        self.feed(str(fh))
+        self.rate = float(rate)
+        if self.rate <= 0:
+            raise ValueError("The rate must be greater than zero")
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take tokens from the bucket and return the seconds to wait
+           before using them, the bucket can go in debt for amounts bigger
+           than the burst
+
+           :param float amount: the number of tokens to take
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self, amount=1):
+        """Wait until the tokens are available
+
+           :param float amount: the number of tokens to take
+        """
+        delay = self.reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _loadFallocate():
+    """Return the fallocate function of the C library, None if it is not
+       available (not Linux)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        func = libc.fallocate
+    except (OSError, TypeError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64,
+                     ctypes.c_int64]
+    func.restype = ctypes.c_int
+    return func
 
-    def handle_starttag(self, tag, attrs):
-        if tag == 'a':
-            attrD = dict(attrs)
-            self.fileids.append(attrD['href'].replace('/', ''))
+
+_FALLOCATE = _loadFallocate()
+#: fallocate mode allocating the blocks without changing the file size
+FALLOC_FL_KEEP_SIZE = 1
+
+
+def preallocate(fileobj, offset, length):
+    """Allocate the disk blocks of a file without changing its size, the
+       blocks are contiguous on most file systems. It works only on Linux
+
+       :param fileobj: the file object opened for writing
+       :param int offset: the position of the first byte to allocate
+       :param int length: the number of bytes to allocate
+
+       :return: True if the space is allocated, False if it is not
+                supported by the system or by the file system
+    """
+    if _FALLOCATE is None or length <= 0:
+        return False
+    if _FALLOCATE(fileobj.fileno(), FALLOC_FL_KEEP_SIZE, offset, length):
+        if ctypes.get_errno() == errno.ENOSPC:
+            raise DiskSpaceError(errno.ENOSPC, "No space left on device "
+                                 "to allocate {num} bytes".format(num=length))
+        return False
+    return True
+
+
+class DiskSpaceError(IOError):
+    """The free space of the destination folder is not enough"""
+    pass
+
+
+class _Reservation:
+    """The space reserved by a transfer, it is released at the end of the
+       transfer or when the space is allocated on the disk
+
+       :param diskspace: the DiskSpace object
+       :param int size: the number of bytes reserved
+    """
+    def __init__(self, diskspace, size):
+        """Function to initialize the object"""
+        self.diskspace = diskspace
+        self.size = size
+
+    def release(self):
+        """Release the reserved space"""
+        if self.size:
+            self.diskspace._release(self.size)
+            self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class DiskSpace:
+    """Check the free space of the destination folder before each
+       transfer, counting the space still needed by the transfers in
+       progress. The new transfers wait while the free space is lower than
+       the watermark, the transfers in progress are not stopped
+
+       :param str folder: the folder where the files are written
+       :param int watermark: the free bytes to keep on the disk
+       :param float interval: seconds between two checks of the free space
+                              while waiting
+       :param float maxwait: maximum seconds to wait for free space before
+                             raising DiskSpaceError, None == no limit
+       :param bool allocate: True to allocate the space of the files before
+                             writing them, see preallocate
+    """
+    def __init__(self, folder, watermark=0, interval=10, maxwait=None,
+                 allocate=True):
+        """Function to initialize the object"""
+        self.folder = folder
+        self.watermark = int(watermark)
+        self.interval = interval
+        self.maxwait = maxwait
+        self.allocate = allocate
+        # the bytes reserved by the transfers in progress
+        self._reserved = 0
+        self._lock = threading.Lock()
+        # True while the transfers are waiting for free space
+        self.paused = False
+
+    def free(self):
+        """Return the free bytes of the disk, less the reserved ones"""
+        return shutil.disk_usage(self.folder).free - self._reserved
+
+    def _take(self, size):
+        """Reserve the space if available, return a _Reservation object or
+           None"""
+        with self._lock:
+            if self.free() - size < self.watermark:
+                return None
+            self._reserved += size
+        return _Reservation(self, size)
+
+    def _release(self, size):
+        """Release reserved bytes"""
+        with self._lock:
+            self._reserved -= size
+
+    def reserve(self, size, wait=True):
+        """Reserve the space for a transfer, waiting until it is available
+
+           :param int size: the number of bytes to write
+           :param bool wait: False to return None immediately if the space
+                             is not available
+
+           :return: a _Reservation object, to use as context manager
+        """
+        size = max(0, int(size or 0))
+        reservation = self._take(size)
+        if reservation or not wait:
+            return reservation
+        start = time.time()
+        while reservation is None:
+            if not self.paused:
+                self.paused = True
+                logging.warning("The free space of {fol} is lower than "
+                                "{wat} bytes, the downloads are paused".format(
+                                    fol=self.folder,
+                                    wat=self.watermark + size))
+            if self.maxwait is not None and \
+                    time.time() - start > self.maxwait:
+                raise DiskSpaceError(errno.ENOSPC, "Not enough free space in"
+                                     " {fol} for {num} bytes".format(
+                                         fol=self.folder, num=size))
+            time.sleep(self.interval)
+            reservation = self._take(size)
+        if self.paused:
+            self.paused = False
+            logging.warning("Free space available, the downloads are "
+                            "resumed")
+        return reservation
+
+    def wait(self, size=0):
+        """Wait until size bytes could be written keeping the watermark
+
+           :param int size: the number of bytes
+        """
+        self.reserve(size).release()
+
+
+class DownloadMetrics:
+    """Collect the metrics of the downloads: duration, bytes, time to the
+       first byte, attempts and HTTP status of each file, latency of the
+       listings and the totals of each day
+
+       :param str jsonfile: the file where a JSON line is appended for each
+                            file and listing, None to keep them only in
+                            memory
+    """
+    def __init__(self, jsonfile=None):
+        """Function to initialize the object"""
+        self.jsonfile = jsonfile
+        # the records of the files and of the listings
+        self.files = []
+        self.listings = []
+        self._lock = threading.Lock()
+        # the record of the file transferred by each thread or asyncio task
+        self._current = contextvars.ContextVar('transfer', default=None)
+
+    def _add(self, records, record):
+        """Store a record and write it to the JSON lines file
+
+           :param list records: the list of records
+           :param dict record: the record to add
+        """
+        with self._lock:
+            records.append(record)
+            if self.jsonfile:
+                with open(self.jsonfile, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    def begin(self, name, day):
+        """Start the record of a file transfer
+
+           :param str name: the name of the file
+           :param str day: the day in format YYYY.MM.DD
+        """
+        now = time.time()
+        self._current.set({'type': 'file', 'name': name, 'day': day,
+                           'start': now, 'sent': now, 'bytes': 0,
+                           'ttfb': None, 'code': None})
+
+    def request(self):
+        """Set the time of the request of a new attempt of the current
+           transfer, the time to the first byte is measured from it"""
+        self.update(sent=time.time(), ttfb=None)
+
+    def update(self, **values):
+        """Set some values of the record of the current transfer"""
+        record = self._current.get()
+        if record is not None:
+            record.update(values)
+
+    def count(self, size):
+        """Add the bytes received to the record of the current transfer
+
+           :param int size: the number of bytes
+        """
+        record = self._current.get()
+        if record is not None:
+            record['bytes'] += size
+            if record['ttfb'] is None:
+                record['ttfb'] = time.time() - record['sent']
+
+    def end(self, status, size=None, attempts=1):
+        """Close the record of the current transfer
+
+           :param str status: 'done' or 'failed'
+           :param int size: the size of the file
+           :param int attempts: the number of attempts of the transfer
+        """
+        record = self._current.get()
+        if record is None:
+            return
+        self._current.set(None)
+        record.update(status=status, size=size, attempts=attempts,
+                      seconds=time.time() - record['start'])
+        self._add(self.files, record)
+
+    def addListing(self, url, seconds, code=None, cached=False):
+        """Store the record of a listing
+
+           :param str url: the url or the directory of the listing
+           :param float seconds: the duration of the request
+           :param int code: the HTTP status of the response
+           :param bool cached: True if the listing was in the cache
+        """
+        self._add(self.listings, {'type': 'listing', 'url': url,
+                                  'start': time.time() - seconds,
+                                  'seconds': seconds, 'code': code,
+                                  'cached': cached})
+
+    def summary(self):
+        """Return a dictionary with the totals of the downloads and of each
+           day"""
+        with self._lock:
+            files = list(self.files)
+            listings = [r for r in self.listings if not r['cached']]
+            cached = len(self.listings) - len(listings)
+        days = {}
+        for r in files:
+            day = days.setdefault(r['day'], {'files': 0, 'failed': 0,
+                                             'bytes': 0, 'seconds': 0.0})
+            day['files'] += 1
+            day['failed'] += r['status'] != 'done'
+            day['bytes'] += r['bytes']
+            day['seconds'] += r['seconds']
+        nbytes = sum(r['bytes'] for r in files)
+        if files:
+            elapsed = max(r['start'] + r['seconds'] for r in files) - \
+                min(r['start'] for r in files)
+        else:
+            elapsed = 0.0
+        ttfb = [r['ttfb'] for r in files if r['ttfb'] is not None]
+        return {'files': len(files),
+                'failed': sum(r['status'] != 'done' for r in files),
+                'bytes': nbytes, 'seconds': elapsed,
+                'rate': nbytes / elapsed if elapsed else 0.0,
+                'retries': sum(r['attempts'] - 1 for r in files),
+                'ttfb': sum(ttfb) / len(ttfb) if ttfb else None,
+                'listings': len(listings), 'cachedlistings': cached,
+                'listingseconds': sum(r['seconds'] for r in listings) /
+                len(listings) if listings else None,
+                'days': days}
+
+    def writePrometheus(self, filename, product=None):
+        """Write the summary in the Prometheus text format, it can be read
+           by the textfile collector of the node exporter
+
+           :param str filename: the output file
+           :param str product: the product, used as label of the metrics
+        """
+        summ = self.summary()
+        label = '{{product="{pro}"}}'.format(pro=product) if product else ''
+        metrics = [
+            ('pymodis_files_total', 'counter', 'Files downloaded',
+             summ['files'] - summ['failed']),
+            ('pymodis_failed_files_total', 'counter', 'Files failed',
+             summ['failed']),
+            ('pymodis_bytes_total', 'counter', 'Bytes downloaded',
+             summ['bytes']),
+            ('pymodis_retries_total', 'counter', 'Attempts repeated',
+             summ['retries']),
+            ('pymodis_download_seconds', 'gauge', 'Duration of the '
+             'downloads', summ['seconds']),
+            ('pymodis_download_rate_bytes', 'gauge', 'Bytes downloaded '
+             'per second', summ['rate']),
+            ('pymodis_ttfb_seconds', 'gauge', 'Mean time to the first '
+             'byte of the files', summ['ttfb']),
+            ('pymodis_listings_total', 'counter', 'Listings requested to '
+             'the server', summ['listings']),
+            ('pymodis_listing_seconds', 'gauge', 'Mean duration of the '
+             'listings', summ['listingseconds']),
+            ('pymodis_last_run_timestamp_seconds', 'gauge', 'Time of the '
+             'last run', time.time())]
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            for name, mtype, desc, value in metrics:
+                if value is None:
+                    continue
+                f.write("# HELP {na} {de}\n# TYPE {na} {ty}\n{na}{la} "
+                        "{va}\n".format(na=name, de=desc, ty=mtype, la=label,
+                                        va=value))
+        os.replace(tmp, filename)
+
+
+class GranuleSearch:
+    """Discover the files of a product with a CMR-like granule search API,
+       a few paginated requests replace the listings of all the day
+       directories
+
+       :param str url: the url of the granule search endpoint returning JSON
+       :param int pagesize: the number of granules of each page
+    """
+    #: the granule search of NASA Common Metadata Repository
+    CMR = "https://cmr.earthdata.nasa.gov/search/granules.json"
+
+    def __init__(self, url=CMR, pagesize=2000):
+        """Function to initialize the object"""
+        self.url = url
+        self.pagesize = int(pagesize)
+
+    def params(self, product, end, start=None, tiles=None):
+        """Return the parameters of the query
+
+           :param str product: the product with the version, like
+                               MOD11A1.061
+           :param end: the last day, a datetime.date object
+           :param start: the first day, None for no limit
+           :param list tiles: the tiles to search, None for all tiles
+        """
+        code, version = product.split('.')[:2]
+        temporal = "{st},{en}T23:59:59Z".format(
+            st=start.strftime("%Y-%m-%dT00:00:00Z") if start else '',
+            en=end.strftime("%Y-%m-%d"))
+        params = [('short_name', code), ('version', version),
+                  ('temporal[]', temporal), ('sort_key[]', '-start_date'),
+                  ('page_size', self.pagesize)]
+        if tiles:
+            params.append(('options[readable_granule_name][pattern]',
+                           'true'))
+            params.extend(('readable_granule_name[]',
+                           '{co}.A*.{ti}.*'.format(co=code, ti=tile))
+                          for tile in tiles)
+        return params
+
+    def files(self, entry, jpeg=False):
+        """Return the day directory and the files of a granule
+
+           :param dict entry: the granule returned by the search
+           :param bool jpeg: True to add the JPG browse files
+
+           :return: the day in format YYYY.MM.DD and a list of files
+        """
+        links = entry.get('links', [])
+        datalinks = [os.path.basename(urlparse(li['href']).path)
+                     for li in links if li.get('rel', '').endswith('data#')]
+        name = entry.get('producer_granule_id') or entry.get('title')
+        hdfs = [li for li in datalinks if li.endswith('.hdf')]
+        if hdfs:
+            name = hdfs[0]
+        record = GranuleName.parse(name)
+        if record:
+            day = record.day.strftime("%Y.%m.%d")
+        else:
+            day = entry['time_start'][:10].replace('-', '.')
+        files = [name, name + '.xml']
+        if jpeg:
+            files.extend(os.path.basename(urlparse(li['href']).path)
+                         for li in links
+                         if li.get('rel', '').endswith('browse#') and
+                         li['href'].endswith('.jpg'))
+        return day, files
+
+    def search(self, get, product, end, start=None, tiles=None, days=None,
+               jpeg=False):
+        """Return the files of each day, the pages are requested following
+           the CMR-Search-After header
+
+           :param get: a function sending a request, it receives the
+                       parameters and the headers and returns a requests
+                       Response object
+           :param str product: the product with the version, like
+                               MOD11A1.061
+           :param end: the last day, a datetime.date object
+           :param start: the first day, None for no limit
+           :param list tiles: the tiles to search, None for all tiles
+           :param int days: the number of days to return when start is None,
+                            the most recent ones
+           :param bool jpeg: True to add the JPG browse files
+
+           :return: a dictionary with the days in format YYYY.MM.DD as keys
+                    and the lists of files as values
+        """
+        params = self.params(product, end, start, tiles)
+        first = start.strftime("%Y.%m.%d") if start else None
+        found = {}
+        headers = {'Accept': 'application/json'}
+        while True:
+            http = get(params, headers)
+            entries = http.json().get('feed', {}).get('entry', [])
+            for entry in entries:
+                day, files = self.files(entry, jpeg)
+                # composite granules starting before the first day
+                if first and day < first:
+                    continue
+                found.setdefault(day, []).extend(files)
+            # the granules are sorted by date, the last day could be
+            # incomplete only if more days than required are found
+            if days and len(found) > days:
+                for day in sorted(found, reverse=True)[days:]:
+                    del found[day]
+                break
+            after = http.headers.get('CMR-Search-After')
+            if not entries or not after or len(entries) < self.pagesize:
+                break
+            headers['CMR-Search-After'] = after
+        return found
+
+
+_HREF = re.compile(r"""<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|'([^']*)'|"""
+                   r"""([^\s>]+))""", re.IGNORECASE)
+
+_DATEDIR = re.compile(r'(\d{4})[/.-](\d{2})[/.-](\d{2})$')
+
+
+def _toDate(day):
+    """Return a datetime.date object from a date or a string
+
+       :param day: a datetime.date or a string in format YYYY-MM-DD or
+                   YYYY.MM.DD
+    """
+    if isinstance(day, date):
+        return day
+    return str2date(day)
+
+
+def yearlyWindows(start, end, firstyear, lastyear):
+    """Return the same period of several years, for example every June
+       from 2003 to 2023 is yearlyWindows('06-01', '06-30', 2003, 2023).
+       A period with start after end crosses the end of the year
+
+       :param str start: the first day of the period in format MM-DD
+       :param str end: the last day of the period in format MM-DD
+       :param int firstyear: the year of the first period
+       :param int lastyear: the year of the last period
+
+       :return: a list of tuples (start, end) with datetime.date objects
+    """
+    smonth, sday = [int(i) for i in re.split('[-./]', start)]
+    emonth, eday = [int(i) for i in re.split('[-./]', end)]
+    cross = (emonth, eday) < (smonth, sday)
+    return [(date(year, smonth, sday), date(year + cross, emonth, eday))
+            for year in range(int(firstyear), int(lastyear) + 1)]
+
+
+class DateIndex:
+    """A sorted index of the directories of the days on the server, the
+       queries use a binary search on the dates. The days are returned
+       newest first, like in the directory list of downModis
+
+       :param list names: the names of the directories, in format
+                          YYYY.MM.DD, the other names are ignored
+    """
+    def __init__(self, names):
+        """Function to initialize the object"""
+        records = []
+        for name in names:
+            match = _DATEDIR.match(name)
+            if match:
+                records.append((date(*[int(i) for i in match.groups()]),
+                                name))
+        records.sort()
+        #: the sorted dates of the directories
+        self.dates = [rec[0] for rec in records]
+        #: the names of the directories in the same order of dates
+        self.names = [rec[1] for rec in records]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def get(self, day):
+        """Return the directory of a day, None if it is not on the server
+
+           :param day: the day as datetime.date or string
+        """
+        day = _toDate(day)
+        pos = bisect.bisect_left(self.dates, day)
+        if pos < len(self.dates) and self.dates[pos] == day:
+            return self.names[pos]
+        return None
+
+    def _slice(self, start=None, end=None):
+        """Return the positions of the first and after the last day of a
+           range
+
+           :param start: the first day, None for the oldest day
+           :param end: the last day, None for the newest day
+        """
+        first = 0 if start is None else \
+            bisect.bisect_left(self.dates, _toDate(start))
+        last = len(self.dates) if end is None else \
+            bisect.bisect_right(self.dates, _toDate(end))
+        return first, max(first, last)
+
+    def range(self, start=None, end=None):
+        """Return the days between start and end, both included
+
+           :param start: the first day as datetime.date or string, None
+                         for the oldest day
+           :param end: the last day as datetime.date or string, None for
+                       the newest day
+
+           :return: a list of the names of the directories, newest first
+        """
+        first, last = self._slice(start, end)
+        return self.names[first:last][::-1]
+
+    def last(self, end, count):
+        """Return the last days available before end
+
+           :param end: the last day as datetime.date or string
+           :param int count: the number of days to return, the days missing
+                             on the server are not counted
+
+           :return: a list of the names of the directories, newest first
+        """
+        first, last = self._slice(None, end)
+        return self.names[max(first, last - count):last][::-1]
+
+    def windows(self, windows):
+        """Return the days of several periods, the periods could overlap
+
+           :param list windows: a list of tuples (start, end), see range
+
+           :return: a list of the names of the directories, newest first
+        """
+        positions = set()
+        for start, end in windows:
+            positions.update(range(*self._slice(start, end)))
+        return [self.names[i] for i in sorted(positions, reverse=True)]
+
+
+def filterFiles(listfiles, tileset=None, jpeg=False):
+    """Return the files of a FTP listing to download, every name is parsed
+       once
+
+       :param list listfiles: the names of the files in the directory
+       :param tileset: the frozenset of the tiles to download, None for all
+                       the tiles
+       :param bool jpeg: True to also return the jpeg files of the tiles
+
+       :return: the list of the selected names
+    """
+    finalList = []
+    for i in listfiles:
+        # the names of the other tiles are skipped without parsing them,
+        # the tile is the third part, the fourth one of the jpeg files
+        if tileset:
+            parts = i.split('.', 4)
+            if len(parts) < 4 or (parts[2] not in tileset and
+                                  parts[3] not in tileset):
+                continue
+        record = GranuleName.parse(i)
+        # without tiles all the files except the jpeg files
+        if not tileset:
+            if record and not record.browse:
+                finalList.append(i)
+            elif not record and not (i.endswith('.jpg') or
+                                     i.startswith('BROWSE.')):
+                finalList.append(i)
+        # the hdf files of the tiles, and the jpeg files if required
+        elif record and record.tile in tileset and \
+                (jpeg or not record.browse):
+            finalList.append(i)
+    return finalList
+
+
+class modisHtmlParser:
+    """A class to extract the links of a HTML directory index with a
+       regular expression, the names of the files are parsed only once
+
+       :param fh: content of http request, bytes or string
+       :param list fileids: the links already extracted from the content,
+                            fh is not parsed if it is set
+    """
+    def __init__(self, fh, fileids=None):
+        """Function to initialize the object"""
+        if fileids is not None:
+            self.fileids = list(fileids)
+        else:
+            if isinstance(fh, bytes):
+                fh = fh.decode('utf-8', 'replace')
+            self.fileids = []
+            for match in _HREF.finditer(fh or ''):
+                href = match.group(1) or match.group(2) or match.group(3)
+                if '&' in href:
+                    href = html.unescape(href)
+                self.fileids.append(href.replace('/', ''))
+        # the files of each product and tile, the names of the products
+        # without tiles (like the CMG ones) are kept under the tile None
+        self._files = {}
+        for name in self.fileids:
+            record = GranuleName.parse(name)
+            if record:
+                self._files.setdefault((record.product, record.tile),
+                                       []).append(record)
+                continue
+            parts = name.split('.')
+            if len(parts) > 1 and 'jpg' not in parts and \
+               'BROWSE' not in parts:
+                self._files.setdefault((parts[0], None), []).append(name)
 
     def get_all(self):
         """Return everything"""
         return self.fileids
 
+    def get_records(self):
+        """Return the GranuleName objects of the MODIS files"""
+        return [rec for key, recs in self._files.items() if key[1]
+                for rec in recs]
+
     def get_dates(self):
         """Return a list of directories with date"""
-        regex = re.compile('(\d{4})[/.-](\d{2})[/.-](\d{2})$')
-        alldata = set([elem for elem in self.fileids if regex.match(elem)])
+        alldata = set([elem for elem in self.fileids
+                       if _DATEDIR.match(elem)])
         return sorted(list(alldata))
 
     def get_tiles(self, prod, tiles, jpeg=False):
@@ -181,28 +1460,24 @@ class modisHtmlParser(HTMLParser):
 
            :param str prod: the code of MODIS product that we are going to
                             analyze
-           :param list tiles: the list of tiles to consider
+           :param tiles: the list or frozenset of tiles to consider
            :param bool jpeg: True to also check for jpeg data
         """
+        if tiles:
+            # a frozenset is not copied
+            keys = [(prod, tile) for tile in frozenset(tiles)]
+        else:
+            keys = sorted((key for key in self._files if key[0] == prod),
+                          key=lambda key: key[1] or '')
         finalList = []
-        for i in self.fileids:
-            # distinguish jpg from hdf by where the tileID is within the string
-            # jpgs have the tileID at index 3, hdf have tileID at index 2
-            name = i.split('.')
-            # if product is not in the filename, move to next filename in list
-            if not name.count(prod):
+        for key in keys:
+            if key[1] is None:
+                finalList.extend(self._files[key])
                 continue
-            # if tiles are not specified and the file is not a jpg, add to list
-            if not tiles and not (name.count('jpg') or name.count('BROWSE')):
-                finalList.append(i)
-            # if tiles are specified
-            if tiles:
-                # if a tileID is at index 3 and jpgs are to be downloaded
-                if tiles.count(name[3]) == 1 and jpeg:
-                    finalList.append(i)
-                # if a tileID is at in index 2, it is known to be HDF
-                elif tiles.count(name[2]) == 1:
-                    finalList.append(i)
+            for rec in self._files.get(key, ()):
+                # the jpg files are added only for the selected tiles
+                if not rec.browse or (jpeg and tiles):
+                    finalList.append(rec.name)
         return finalList
 
 
@@ -239,12 +1514,74 @@ class downModis:
        :param bool debug: set to True if you want to obtain debug information
        :param int timeout: Timeout value for HTTP server (seconds)
        :param bool checkgdal: variable to set the GDAL check
+       :param int workers: number of files downloaded in parallel, 1 means
+                           sequential download
+       :param int hostconn: maximum number of simultaneous connections to
+                            the same host, None == same as workers
+       :param int chunksize: size in bytes of the chunks used to stream the
+                             downloaded files to disk
+       :param int poolsize: maximum number of HTTP connections kept open for
+                            each host, None == max(10, workers)
+       :param retry: a RetryPolicy object used for all the network
+                     operations, None == the default RetryPolicy
+       :param listcache: True to store the listings of the HTTP server in
+                         the file listcache<product>.json inside
+                         destinationFolder, or a ListingCache object
+       :param statedb: True to store the state of the downloaded files in
+                       the SQLite database state<product>.sqlite inside
+                       destinationFolder, or a DownloadState object. The
+                       destination folder is scanned only to create the
+                       database
+       :param bool checksum: True to verify size and checksum of the HDF
+                             files against the values in their XML metadata
+                             file, instead of opening them with GDAL
+       :param maxrate: maximum number of bytes per second downloaded by all
+                       the transfers, or a RateLimiter object; None == no
+                       limit
+       :param maxrequests: maximum number of requests per second sent to the
+                           server, or a RateLimiter object; None == no limit
+       :param metrics: a DownloadMetrics object collecting the metrics of
+                       the downloads, None == a new one kept in memory
+       :param bbox: a bounding box in geographic coordinates, as string
+                    'west,south,east,north' or sequence of four numbers;
+                    the tiles intersecting it are added to tiles
+       :param str aoi: a POLYGON or MULTIPOLYGON geometry in WKT format in
+                       geographic coordinates; the tiles intersecting it are
+                       added to tiles
+       :param search: True to discover the files with the NASA CMR granule
+                      search instead of the directory listings of the HTTP
+                      server, or the url of a CMR-like endpoint, or a
+                      GranuleSearch object
+       :param session: a ModisSession object shared with other downModis
+                       objects, None == a new one with the credentials of
+                       this object
+       :param diskspace: True to check the free space of destinationFolder
+                         before each transfer and to allocate the files
+                         before writing them, a number to also pause the
+                         downloads while the free bytes are less than it,
+                         or a DiskSpace object; None == no check
+       :param ongranule: a function called as ongranule(day, path) after
+                         each file is downloaded, or a queue.Queue object
+                         receiving the tuples (day, path)
+       :param onday: a function called as onday(day, files) when all the
+                     files of a day are downloaded, files is the list of
+                     the HDF files of the day in destinationFolder, also the
+                     ones downloaded before; or a queue.Queue object
+                     receiving the tuples (day, files). It is not called
+                     for the days without new files or with failed files.
+                     See pipelinemodis.ProcessPipeline
     """
 
     def __init__(self, destinationFolder, password=None, user=None, token=None,
                  url="https://e4ftl01.cr.usgs.gov", tiles=None, path="MOLT",
                  product="MOD11A1.006", today=None, enddate=None, delta=10,
-                 jpg=False, debug=False, timeout=30, checkgdal=True):
+                 jpg=False, debug=False, timeout=30, checkgdal=True,
+                 workers=1, hostconn=None, chunksize=1048576,
+                 poolsize=None, retry=None, listcache=False,
+                 statedb=False, checksum=False, maxrate=None,
+                 maxrequests=None, metrics=None, bbox=None, aoi=None,
+                 search=None, session=None, diskspace=None,
+                 ongranule=None, onday=None):
         """Function to initialize the object"""
 
         self.token = None
@@ -263,6 +1600,9 @@ class downModis:
             self.urltype = 'http'
         else:
             raise IOError("The url should contain 'ftp://' or 'http://'")
+        if search and self.urltype != 'http':
+            raise IOError("The granule search can be used only with HTTP "
+                          "servers")
 
         # token case
         if token: 
@@ -308,10 +1648,6 @@ class downModis:
             userAndPass = b64encode(str.encode(self.userpwd)).decode("ascii")
             self.http_header = {'Authorization': 'Basic %s' %  userAndPass}
 
-        cookieprocessor = urllib.request.HTTPCookieProcessor()
-        opener = urllib.request.build_opener(ModisHTTPRedirectHandler,
-                                             cookieprocessor)
-        urllib.request.install_opener(opener)
         # the product (product_code.004 or product_cod.005)
         self.product = product
         self.product_code = product.split('.')[0]
@@ -322,6 +1658,17 @@ class downModis:
             self.tiles = tiles.split(',')
         else:  # tiles are list, tuple, or None
             self.tiles = tiles
+        # add the tiles intersecting the area of interest
+        if bbox or aoi:
+            from .tilesmodis import tilesFromBbox, tilesFromWkt
+            aoitiles = set(self.tiles or [])
+            if bbox:
+                aoitiles.update(tilesFromBbox(bbox))
+            if aoi:
+                aoitiles.update(tilesFromWkt(aoi))
+            self.tiles = sorted(aoitiles)
+        # the tiles filter of the listings, built only once
+        self._tileset = frozenset(self.tiles) if self.tiles else None
         # set destination folder
         if not os.path.isdir(destinationFolder):
             os.makedirs(destinationFolder)
@@ -365,19 +1712,106 @@ class downModis:
         logging.captureWarnings(True)
         # global connection attempt counter
         self.nconnection = 0
+        # policy to retry the network operations
+        if retry is None:
+            retry = RetryPolicy()
+        self.retry = retry
+        # the day directory entered on the FTP server
+        self._ftpday = None
+        # pool of FTP connections, created by connect
+        self.ftppool = None
+        # cache of the HTTP listings
+        if listcache is True:
+            listcache = ListingCache(os.path.join(
+                self.writeFilePath,
+                'listcache{pro}.json'.format(pro=self.product)))
+        self.listcache = listcache or None
         # timeout for HTTP connection before failing (seconds)
         self.timeout = timeout
+        # number of parallel downloads
+        self.workers = max(1, int(workers))
+        # maximum number of connections to the same host
+        if hostconn:
+            self.hostconn = max(1, int(hostconn))
+        else:
+            self.hostconn = self.workers
+        # size of the chunks written to disk during the download (bytes)
+        self.chunksize = int(chunksize)
+        # HTTP session shared by all the requests, it keeps alive the
+        # connections and the authentication cookies
+        if not poolsize:
+            poolsize = max(10, self.workers)
+        if session is None:
+            session = ModisSession(self.http_header, poolsize=poolsize)
+        session.authhosts.add(urlparse(url).hostname)
+        self.session = session
+        # semaphores limiting the connections for each host
+        self._hostSlots = {}
+        # lock to keep shared objects consistent between download threads
+        self._lock = threading.RLock()
+        # database with the state of the downloaded files
+        if statedb is True:
+            statedb = DownloadState(os.path.join(
+                self.writeFilePath,
+                'state{pro}.sqlite'.format(pro=self.product)))
+        self.state = statedb or None
+        if self.state and self.state.isEmpty():
+            self.state.importFolder(self.writeFilePath)
         # files within the directory where data will be saved
-        self.fileInPath = []
-        for f in os.listdir(self.writeFilePath):
-            if os.path.isfile(os.path.join(self.writeFilePath, f)):
-                self.fileInPath.append(f)
+        if self.state:
+            self.fileInPath = list(self.state.complete)
+        else:
+            self.fileInPath = []
+            for f in os.listdir(self.writeFilePath):
+                if os.path.isfile(os.path.join(self.writeFilePath, f)):
+                    self.fileInPath.append(f)
+        # verify the files using the checksum in the XML metadata
+        self.checksum = checksum
+        # checksums computed during the downloads
+        self._checksums = {}
+        # index of the local files by prefix and extension, built at the
+        # first download
+        self._localIndex = None
+        # limits of the bandwidth and of the requests per second
+        if maxrate and not isinstance(maxrate, RateLimiter):
+            maxrate = RateLimiter(maxrate)
+        self.ratelimit = maxrate or None
+        if maxrequests and not isinstance(maxrequests, RateLimiter):
+            maxrequests = RateLimiter(maxrequests)
+        self.requestlimit = maxrequests or None
+        # discovery of the files with the granule search
+        if search is True:
+            search = GranuleSearch()
+        elif isinstance(search, str):
+            search = GranuleSearch(search)
+        self.search = search or None
+        # files of each day found by the granule search
+        self._searchFiles = None
+        # free space of the destination folder
+        if diskspace is True:
+            diskspace = DiskSpace(self.writeFilePath)
+        elif diskspace and not isinstance(diskspace, DiskSpace):
+            diskspace = DiskSpace(self.writeFilePath, watermark=diskspace)
+        self.diskspace = diskspace or None
+        # functions or queues notified when the files and the days are
+        # downloaded
+        self.ongranule = ongranule
+        self.onday = onday
+        # the files of each day still to download, for onday
+        self._pendingDays = {}
+        # metrics of the downloads
+        if metrics is None:
+            metrics = DownloadMetrics()
+        self.metrics = metrics
         global GDAL
         if not GDAL and checkgdal:
             logging.warning("WARNING: Python GDAL library not found")
         elif GDAL and not checkgdal:
             GDAL = False
         self.dirData = []
+        # index of the dates of dirData, built when it is needed
+        self._dateIndex = None
+        self._dateIndexData = None
         # set today and enday dates
         self._getToday()
 
@@ -392,6 +1826,55 @@ class downModis:
             fil = os.path.join(self.writeFilePath, f)
             if os.path.getsize(fil) == 0:
                 os.remove(fil)
+                self._indexRemove(f)
+
+    def _indexKey(self, name):
+        """Return the key of a file in the index of the local files, the
+           parts of the name without the production date, see
+           GranuleName.key
+
+           :param str name: the name of the file
+        """
+        record = GranuleName.parse(name)
+        if record:
+            return record.key
+        fileSplit = name.split('.')
+        return '.'.join(fileSplit[:4]), fileSplit[-1]
+
+    def _buildIndex(self):
+        """Build the index of the files in the save directory, it is
+           scanned only once"""
+        self._localIndex = {}
+        for f in os.listdir(self.writeFilePath):
+            if f.endswith('.part') or f.count('.') < 4:
+                continue
+            self._localIndex.setdefault(self._indexKey(f), set()).add(f)
+
+    def _indexLookup(self, name):
+        """Return the local files with the same prefix and extension of
+           a file, it replaces the scan of the save directory
+
+           :param str name: the name of the file
+        """
+        if self._localIndex is None:
+            self._buildIndex()
+        return sorted(self._localIndex.get(self._indexKey(name), ()))
+
+    def _indexAdd(self, name):
+        """Add a downloaded file to the index of the local files
+
+           :param str name: the name of the file
+        """
+        if self._localIndex is not None:
+            self._localIndex.setdefault(self._indexKey(name), set()).add(name)
+
+    def _indexRemove(self, name):
+        """Remove a deleted file from the index of the local files
+
+           :param str name: the name of the file
+        """
+        if self._localIndex is not None:
+            self._localIndex.get(self._indexKey(name), set()).discard(name)
 
     def connect(self, ncon=20):
         """Connect to the server and fill the dirData variable
@@ -401,6 +1884,8 @@ class downModis:
         """
         if self.urltype == 'ftp':
             self._connectFTP(ncon)
+        elif self.search:
+            self._connectSearch(ncon)
         elif self.urltype == 'http':
             self._connectHTTP(ncon)
         if len(self.dirData) == 0:
@@ -414,27 +1899,64 @@ class downModis:
                             server before failing. If ncon < 0, connection
                             attempts are unlimited in number
         """
-        self.nconnection += 1
+        url = urljoin(self.url, self.path)
+
+        def index():
+            """Return the list of directories"""
+            self.nconnection += 1
+            return self._getIndex(url, strict=True).get_dates()
+
         try:
-            url = urljoin(self.url, self.path)
-            try:
-                req = urllib.request.Request(url, headers=self.http_header)
-                http = urllib.request.urlopen(req)
-                self.dirData = modisHtmlParser(http.read()).get_dates()
-            except Exception as e:
-                logging.error('Error in connection. Code {code}, '
-                              'reason {re}'.format(code=e.code, re=e.reason))
-                http = urlopen(url, timeout=self.timeout)
-                self.dirData = modisHtmlParser(http.read()).get_dates()
+            self.dirData = self.retry.call(index, attempts=ncon, what=url)
             self.dirData.reverse()
+            if self.listcache:
+                self.listcache.save()
         except Exception as e:
             try:
                 logging.error('Error in connection. Code {code}, '
-                              'reason {re}'.format(code=e.code, re=e.reason))
+                              'reason {re}'.format(
+                                  code=e.response.status_code,
+                                  re=e.response.reason))
             except:
                 logging.error('Error {er}'.format(er=e))
-            if self.nconnection <= ncon or ncon < 0:
-                self._connectHTTP()
+
+    def _connectSearch(self, ncon=20):
+        """Search the files of the selected days and tiles with the granule
+           search, the days found fill the dirData variable
+
+           :param int ncon: maximum number of attempts of each request
+                            before failing
+        """
+        def get(params, headers):
+            """Request a page of the search"""
+            self._waitRequest()
+            start = time.time()
+            # the credentials of the data server are not sent to the search
+            headers = dict(headers, Authorization=None)
+            http = self.session.get(self.search.url, params=params,
+                                    headers=headers, timeout=self.timeout)
+            self.metrics.addListing(http.url, time.time() - start,
+                                    http.status_code)
+            http.raise_for_status()
+            return http
+
+        def page(params, headers):
+            """Request a page following the retry policy"""
+            self.nconnection += 1
+            return self.retry.call(get, (params, headers), attempts=ncon,
+                                   what=self.search.url)
+
+        try:
+            self._searchFiles = self.search.search(
+                page, self.product, self.today, self.enday, self.tiles,
+                None if self.enday else self.delta, self.jpeg)
+        except RetryPolicy.ERRORS + (ValueError,) as e:
+            logging.error('Error in the granule search: {err}'.format(err=e))
+            self._searchFiles = {}
+        self.dirData = sorted(self._searchFiles, reverse=True)
+        if self.debug:
+            logging.debug("The granule search found {num} days".format(
+                num=len(self.dirData)))
 
     def _connectFTP(self, ncon=20):
         """Set connection to ftp server, move to path where data are stored,
@@ -446,30 +1968,37 @@ class downModis:
         """
         if not self.user and not self.password:
             raise IOError("You must provide a user and password to connect.")
-        self.nconnection += 1
-        try:
-            # connect to ftp server
-            self.ftp = FTP(self.url)
-            self.ftp.login(self.user, self.password)
-            # enter in directory
-            self.ftp.cwd(self.path)
-            self.dirData = []
+        # the pool keeps up to self.hostconn logged-in connections
+        self.ftppool = FTPPool(self.url, self.user, self.password, self.path,
+                               size=self.hostconn, timeout=self.timeout)
+
+        def index():
+            """Return the list of directories"""
+            self.nconnection += 1
+            dirData = []
+            self._waitRequest()
             # return data inside directory
-            self.ftp.dir(self.dirData.append)
+            with self.ftppool.connection() as ftp:
+                ftp.dir(dirData.append)
+            return dirData
+
+        try:
+            self.dirData = self.retry.call(index, attempts=ncon,
+                                           errors=ftplib.all_errors,
+                                           what=self.url)
             # reverse order of data for have first the nearest to today
             self.dirData.reverse()
             # ensure dirData contains only directories, remove all references to files
             self.dirData = [elem.split()[-1] for elem in self.dirData if elem.startswith("d")]
             if self.debug:
                 logging.debug("Open connection {url}".format(url=self.url))
-        except (EOFError, ftplib.error_perm) as e:
+        except ftplib.all_errors as e:
             logging.error('Error in connection: {err}'.format(err=e))
-            if self.nconnection <= ncon:
-                self._connectFTP()
 
     def closeFTP(self):
-        """Close ftp connection and close the file list document"""
-        self.ftp.quit()
+        """Close ftp connections and close the file list document"""
+        if self.ftppool:
+            self.ftppool.close()
         self.closeFilelist()
         if self.debug:
             logging.debug("Close connection {url}".format(url=self.url))
@@ -478,25 +2007,49 @@ class downModis:
         """Function to close the file list of where the files are downloaded"""
         self.filelist.close()
 
+    def _writeFilelist(self, name):
+        """Add a downloaded file to the file list document
+
+           :param str name: the name of the downloaded file
+        """
+        with self._lock:
+            self.filelist.write("{name}\n".format(name=name))
+            self.filelist.flush()
+
+    def _hostSlot(self, url):
+        """Return the semaphore limiting the simultaneous connections to the
+           host of the url
+
+           :param str url: the url to connect to
+        """
+        host = urlparse(url).hostname if URLPARSE else self.url
+        with self._lock:
+            if host not in self._hostSlots:
+                self._hostSlots[host] = threading.BoundedSemaphore(
+                    self.hostconn)
+            return self._hostSlots[host]
+
+    def _waitRequest(self):
+        """Wait until a new request can be sent to the server"""
+        if self.requestlimit:
+            self.requestlimit.acquire()
+
     def setDirectoryIn(self, day):
         """Enter into the file directory of a specified day
 
            :param str day: a string representing a day in format YYYY.MM.DD
         """
-        try:
-            self.ftp.cwd(day)
-        except (ftplib.error_reply, socket.error) as e:
-            logging.error("Error {err} entering in directory "
-                          "{name}".format(err=e, name=day))
-            self.setDirectoryIn(day)
+        def enter():
+            """Enter in the directory"""
+            self._waitRequest()
+            with self.ftppool.connection(day):
+                pass
+        self.retry.call(enter, what="entering in {name}".format(name=day))
+        self._ftpday = day
 
     def setDirectoryOver(self):
         """Move up within the file directory"""
-        try:
-            self.ftp.cwd('..')
-        except (ftplib.error_reply, socket.error) as e:
-            logging.error("Error {err} when trying to come back".format(err=e))
-            self.setDirectoryOver()
+        self._ftpday = None
 
     def _getToday(self):
         """Set the dates for the start and end of downloading"""
@@ -516,35 +2069,49 @@ class downModis:
             delta = self.today - self.enday
             self.delta = abs(delta.days) + 1
 
+    def getDateIndex(self):
+        """Return the DateIndex of the days on the server, it is built
+           again only when dirData changes
+        """
+        # the list is kept to compare it, and its length if it is changed
+        data = self._dateIndexData
+        if not data or data[0] is not self.dirData or \
+                data[1] != len(self.dirData):
+            self._dateIndex = DateIndex(self.dirData)
+            self._dateIndexData = (self.dirData, len(self.dirData))
+        return self._dateIndex
+
     def getListDays(self):
-        """Return a list of all selected days"""
-        today_s = self.today.strftime("%Y.%m.%d")
-        # dirData is reverse sorted
-        for i, d in enumerate(self.dirData):
-            if d <= today_s:
-                today_index = i
-                break
-#            else:
-#                logging.error("No data available for requested days")
-#                import sys
-#                sys.exit()
-        days = self.dirData[today_index:][:self.delta]
-        # this is useful for 8/16 days data, delta could download more images
-        # that you want
+        """Return a list of all selected days, from today to enday or the
+           last delta days available before today if enday is not set"""
+        index = self.getDateIndex()
+        # for 8/16 days data delta could select more days than requested
         if self.enday is not None:
-            enday_s = self.enday.strftime("%Y.%m.%d")
-            delta = 0
-            # make a full cycle from the last index and find
-            # it make a for cicle from the last value and find the internal
-            # delta to remove file outside temporaly range
-            for i in range(0, len(days)):
-                if days[i] < enday_s:
-                    break
-                else:
-                    delta = delta + 1
-            # remove days outside new delta
-            days = days[:delta]
-        return days
+            return index.range(self.enday, self.today)
+        return index.last(self.today, self.delta)
+
+    def getDaysRange(self, start=None, end=None):
+        """Return the days available between start and end, both included
+
+           :param start: the first day as datetime.date or string in format
+                         YYYY-MM-DD, None for the oldest day
+           :param end: the last day as datetime.date or string in format
+                       YYYY-MM-DD, None for the newest day
+
+           :return: a list of days in format YYYY.MM.DD, newest first
+        """
+        return self.getDateIndex().range(start, end)
+
+    def getDaysWindows(self, windows):
+        """Return the days available in several periods, for example every
+           June of some years, see yearlyWindows
+
+           :param list windows: a list of tuples (start, end), see
+                                getDaysRange
+
+           :return: a list of days in format YYYY.MM.DD, newest first
+        """
+        return self.getDateIndex().windows(windows)
 
     def getAllDays(self):
         """Return a list of all days"""
@@ -555,14 +2122,18 @@ class downModis:
            downloaded by default. JPG files will be downloaded if
            self.jpeg == True.
 
-           :param str day: the date of data in format YYYY.MM.DD
+           :param str day: the date of data in format YYYY.MM.DD, for FTP
+                           server None means the directory entered by
+                           setDirectoryIn
 
            :return: a list of files to download for the day
         """
+        if self._searchFiles is not None:
+            return list(self._searchFiles.get(day, []))
         if self.urltype == 'http':
             return self._getFilesListHTTP(day)
         elif self.urltype == 'ftp':
-            return self._getFilesListFTP()
+            return self._getFilesListFTP(day)
 
     def _getFilesListHTTP(self, day):
         """Returns a list of files to download from http server, which will
@@ -571,84 +2142,127 @@ class downModis:
 
            :param str day: the date of data in format YYYY.MM.DD
         """
+        url = urljoin(self.url, self.path, day)
         # return the files list inside the directory of each day
         try:
-            url = urljoin(self.url, self.path, day)
             if self.debug:
                 logging.debug("The url is: {url}".format(url=url))
-            try:
-                http = modisHtmlParser(requests.get(url,
-                                                    timeout=self.timeout).content)
-            except:
-                http = modisHtmlParser(urlopen(url,
-                                               timeout=self.timeout).read())
-            # download JPG files also
-            if self.jpeg:
-                # if tiles not specified, download all files
-                if not self.tiles:
-                    finalList = http.get_all()
-                # if tiles specified, download all files with jpegs
-                else:
-                    finalList = http.get_tiles(self.product_code,
-                                               self.tiles, jpeg=True)
-            # if JPG files should not be downloaded, get only HDF and XML
-            else:
-                finalList = http.get_tiles(self.product_code, self.tiles)
-            if self.debug:
-                logging.debug("The number of file to download is: "
-                              "{num}".format(num=len(finalList)))
-
-            return finalList
-        except (socket.error) as e:
+            http = self.retry.call(self._getIndex, (url, day), what=url)
+            return self._selectFiles(http)
+        except RetryPolicy.ERRORS as e:
             logging.error("Error {err} when try to receive list of "
                           "files".format(err=e))
-            self._getFilesListHTTP(day)
+            return []
+
+    def _selectFiles(self, http):
+        """Return the files of a HTTP directory index to download
+
+           :param http: a modisHtmlParser object
+        """
+        # download JPG files also
+        if self.jpeg:
+            # if tiles not specified, download all files
+            if not self.tiles:
+                finalList = http.get_all()
+            # if tiles specified, download all files with jpegs
+            else:
+                finalList = http.get_tiles(self.product_code,
+                                           self._tileset, jpeg=True)
+        # if JPG files should not be downloaded, get only HDF and XML
+        else:
+            finalList = http.get_tiles(self.product_code, self._tileset)
+        if self.debug:
+            logging.debug("The number of file to download is: "
+                          "{num}".format(num=len(finalList)))
+        return finalList
+
+    def _getIndex(self, url, day=None, strict=False):
+        """Return the parsed directory index of an url. If the listing
+           cache is active, a fresh cached listing is returned without
+           contacting the server and an old one is revalidated
 
-    def _getFilesListFTP(self):
+           :param str url: the url of the directory
+           :param str day: the day of the directory in format YYYY.MM.DD,
+                           None for the product directory
+           :param bool strict: True to raise an error for every HTTP error
+                               status, otherwise only for the statuses
+                               worth a new attempt
+
+           :return: a modisHtmlParser object
+        """
+        entry = None
+        headers = {}
+        if self.listcache:
+            entry = self.listcache.get(url)
+            if entry and self.listcache.isFresh(entry, day):
+                self.metrics.addListing(url, 0.0, cached=True)
+                return modisHtmlParser(None, fileids=entry['links'])
+            if entry and entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry['modified']:
+                headers['If-Modified-Since'] = entry['modified']
+        self._waitRequest()
+        start = time.time()
+        with self._hostSlot(url):
+            http = self.session.get(url, timeout=self.timeout,
+                                    headers=headers)
+        self.metrics.addListing(url, time.time() - start, http.status_code)
+        if entry and http.status_code == 304:
+            self.listcache.touch(url)
+            return modisHtmlParser(None, fileids=entry['links'])
+        if strict:
+            http.raise_for_status()
+        else:
+            self.retry.check(http)
+        parser = modisHtmlParser(http.content)
+        if self.listcache and http.status_code == 200:
+            self.listcache.put(url, parser.get_all(),
+                               http.headers.get('ETag'),
+                               http.headers.get('Last-Modified'))
+        return parser
+
+    def _getFilesListFTP(self, day=None):
         """Create a list of files to download from FTP server, it is possible
            choose to download also the JPG overview files or only the HDF files
+
+           :param str day: the date of data in format YYYY.MM.DD, None for
+                           the directory entered by setDirectoryIn
         """
-        def cicle_file(jpeg=False):
-            """Check the type of file"""
-            finalList = []
-            for i in self.listfiles:
-                name = i.split('.')
-                # distinguish jpeg files from hdf files by the number of index
-                # where find the tile index
-                if not self.tiles and not (name.count('jpg') or
-                                           name.count('BROWSE')):
-                    finalList.append(i)
-                # is a jpeg of tiles number
-                if self.tiles:
-                    if self.tiles.count(name[3]) == 1 and jpeg:
-                        finalList.append(i)
-                # is a hdf of tiles number
-                    elif self.tiles.count(name[2]) == 1:
-                        finalList.append(i)
-            return finalList
+        if day is None:
+            day = self._ftpday
+
+        def listing():
+            """Return the files in the directory"""
+            self._waitRequest()
+            start = time.time()
+            with self.ftppool.connection(day) as ftp:
+                files = ftp.nlst()
+            self.metrics.addListing(day, time.time() - start)
+            return files
 
         # return the file's list inside the directory of each day
         try:
-            self.listfiles = self.ftp.nlst()
+            listfiles = self.retry.call(listing, what="listing files")
             # download also jpeg
             if self.jpeg:
                 # finallist is ugual to all file with jpeg file
                 if not self.tiles:
-                    finalList = self.listfiles
+                    finalList = listfiles
                 # finallist is ugual to tiles file with jpeg file
                 else:
-                    finalList = cicle_file(jpeg=True)
+                    finalList = filterFiles(listfiles, self._tileset,
+                                            jpeg=True)
             # not download jpeg
             else:
-                finalList = cicle_file()
+                finalList = filterFiles(listfiles, self._tileset)
             if self.debug:
                 logging.debug("The number of file to download is: "
                               "{num}".format(num=len(finalList)))
             return finalList
-        except (ftplib.error_reply, socket.error) as e:
+        except RetryPolicy.ERRORS as e:
             logging.error("Error {err} when trying to receive list of "
                           "files".format(err=e))
-            self._getFilesListFTP()
+            return []
 
     def checkDataExist(self, listNewFile, move=False):
         """Check if a file already exists in the local download directory
@@ -667,7 +2281,11 @@ class downModis:
             listNewFile = list()
         elif not self.fileInPath:
             self.fileInPath = list()
-        if not move:
+        if not move and self.state:
+            # only the new files are checked against the database
+            listOfDifferent = [f for f in set(listNewFile)
+                               if not self.state.isComplete(f)]
+        elif not move:
             listOfDifferent = list(set(listNewFile) - set(self.fileInPath))
         elif move:
             listOfDifferent = list(set(self.fileInPath) - set(listNewFile))
@@ -693,125 +2311,552 @@ class downModis:
            :param str filDown: name of the file to download
            :param str filHdf: name of the file to write to
            :param str day: the day in format YYYY.MM.DD
+
+           :return: 0 if file is downloaded, 1 for error
         """
+        if self.state:
+            self.state.start(filDown)
+        self.metrics.begin(filDown, day)
         if self.urltype == 'http':
-            self._downloadFileHTTP(filDown, filHdf, day)
+            result = self._downloadFileHTTP(filDown, filHdf, day)
         elif self.urltype == 'ftp':
-            self._downloadFileFTP(filDown, filHdf)
+            result = self._downloadFileFTP(filDown, filHdf, day)
+        self._finishFile(filDown, filHdf, result, day)
+        return result
+
+    def _finishFile(self, filDown, filHdf, result, day=None):
+        """Update the index of the local files, the state database and the
+           metrics at the end of a download and notify ongranule
+
+           :param str filDown: name of the downloaded file
+           :param str filHdf: name of the written file
+           :param int result: 0 if file is downloaded, 1 for error
+           :param str day: the day in format YYYY.MM.DD
+        """
+        with self._lock:
+            if result == 0:
+                self._indexAdd(os.path.basename(filHdf))
+            checksum = self._checksums.pop(filDown, None)
+        if self.state and result == 0:
+            self.state.done(filDown, os.path.getsize(filHdf), checksum)
+        elif self.state:
+            self.state.failed(filDown)
+        if result == 0:
+            self.metrics.end('done', os.path.getsize(filHdf),
+                             self.retry.lastAttempts())
+        else:
+            self.metrics.end('failed', attempts=self.retry.lastAttempts())
+        if self.ongranule and result == 0:
+            self._notify(self.ongranule, day, filHdf)
+
+    def _notify(self, hook, *args):
+        """Call a function or put the arguments in a queue, the errors
+           are logged and they do not stop the download
+
+           :param hook: a function or an object with the put method
+           :param args: the arguments of the function
+        """
+        try:
+            if hasattr(hook, 'put'):
+                hook.put(args)
+            else:
+                hook(*args)
+        except Exception as e:
+            logging.error("Error notifying the download of {what}: "
+                          "{err}".format(what=args[0], err=e))
+
+    def _startDay(self, day, listAllFiles, listFilesDown):
+        """Register the files of a day to download, onday is notified
+           after the last one, see _fileDone
+
+           :param str day: the day in format YYYY.MM.DD
+           :param list listAllFiles: the files of the day on the server
+           :param list listFilesDown: the files of the day to download
+        """
+        # a day without new files is not processed again
+        if not self.onday or not listFilesDown:
+            return
+        with self._lock:
+            # the files to wait for, the list of the day, the downloaded
+            # files and the failed files
+            self._pendingDays[day] = [len(listFilesDown), listAllFiles, 0, 0]
+
+    def _fileDone(self, day, result=None):
+        """Count a processed file of a day and notify onday after the last
+           one, if at least a file is downloaded and no file failed
+
+           :param str day: the day in format YYYY.MM.DD
+           :param int result: the result of downloadFile, 0 for a
+                              downloaded file, 1 for error, None for a file
+                              not downloaded because it is already present
+        """
+        with self._lock:
+            pending = self._pendingDays.get(day)
+            if pending is None:
+                return
+            pending[0] -= 1
+            if result == 0:
+                pending[2] += 1
+            elif result:
+                pending[3] += 1
+            if pending[0] > 0:
+                return
+            del self._pendingDays[day]
+        if pending[3]:
+            logging.warning("The day {day} is not processed, {num} files "
+                            "failed".format(day=day, num=pending[3]))
+        elif pending[2]:
+            self._endDay(day, pending[1])
+
+    def _endDay(self, day, listAllFiles):
+        """Notify onday with the local HDF files of a day
+
+           :param str day: the day in format YYYY.MM.DD
+           :param list listAllFiles: the files of the day on the server
+        """
+        files = []
+        with self._lock:
+            for name in listAllFiles:
+                if name.endswith('.hdf'):
+                    files.extend(os.path.join(self.writeFilePath, local)
+                                 for local in self._indexLookup(name))
+        if files:
+            self._notify(self.onday, day, files)
+
+    def _writeChunks(self, chunks, filSave, hasher=None):
+        """Write the downloaded data to the file one chunk at time
+
+           :param chunks: an iterable returning the chunks of data
+           :param filSave: the file object to write to
+           :param hasher: an object updating the checksum with the data
+        """
+        for chunk in chunks:
+            if chunk:
+                if self.ratelimit:
+                    self.ratelimit.acquire(len(chunk))
+                self.metrics.count(len(chunk))
+                filSave.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+
+    def _sidecarInfo(self, filDown, day=None):
+        """Return the values of the DataFileContainer element of the XML
+           metadata file of a HDF file. The local XML file is used if it
+           exists, otherwise it is read from the server
+
+           :param str filDown: name of the HDF file
+           :param str day: the day in format YYYY.MM.DD
+
+           :return: a dictionary or None if the XML file is not available
+        """
+        xmlname = filDown + '.xml'
+        xmlpath = os.path.join(self.writeFilePath, xmlname)
+        try:
+            if os.path.exists(xmlpath):
+                with open(xmlpath, 'rb') as f:
+                    content = f.read()
+            elif self.urltype == 'http':
+                url = urljoin(self.url, self.path, day, xmlname)
+                self._waitRequest()
+                with self._hostSlot(url):
+                    http = self.session.get(url, timeout=self.timeout)
+                http.raise_for_status()
+                content = http.content
+            else:
+                buf = io.BytesIO()
+                self._waitRequest()
+                with self.ftppool.connection(day or self._ftpday) as ftp:
+                    ftp.retrbinary("RETR " + xmlname, buf.write)
+                content = buf.getvalue()
+            return getDataFiles(content, filDown) or None
+        except (ElementTree.ParseError, ftplib.error_perm,
+                RetryPolicy.ERRORS) as e:
+            logging.warning("Cannot read the XML file of {name}, the error "
+                            "was '{err}'".format(name=filDown, err=e))
+            return None
+
+    def _startChecksum(self, info, filPart, size):
+        """Return the object computing the checksum declared in the XML
+           metadata, updated with the data already in the partial file
+
+           :param dict info: the values returned by _sidecarInfo
+           :param str filPart: the partial file
+           :param int size: the number of bytes already in the partial file
+
+           :return: a Cksum or hashlib object, None if the checksum cannot
+                    be computed
+        """
+        if not info or not info.get('Checksum'):
+            return None
+        ctype = info.get('ChecksumType', 'CKSUM').upper()
+        if ctype == 'CKSUM':
+            hasher = Cksum()
+        else:
+            try:
+                hasher = hashlib.new(ctype.replace('-', '').lower())
+            except ValueError:
+                logging.warning("Checksum type {ty} not "
+                                "supported".format(ty=ctype))
+                return None
+        if size:
+            with open(filPart, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunksize), b''):
+                    hasher.update(chunk)
+        return hasher
+
+    def _verifyChecksum(self, filDown, filPart, info, hasher):
+        """Check size and checksum of a downloaded file against its XML
+           metadata, the file is removed if they are different
+
+           :param str filDown: name of the downloaded file
+           :param str filPart: the downloaded partial file
+           :param dict info: the values returned by _sidecarInfo
+           :param hasher: the object computing the checksum
+
+           :return: the checksum of the file, None if it is not computed
+        """
+        size = info.get('FileSize')
+        down = os.path.getsize(filPart)
+        if size and int(size) != down:
+            os.remove(filPart)
+            raise IOError("Different size for file {name} - XML metadata: "
+                          "{orig}, downloaded: {down}".format(
+                              name=filDown, orig=size, down=down))
+        if not hasher:
+            return None
+        checksum = hasher.hexdigest()
+        if checksum.lower() != info['Checksum'].lower():
+            os.remove(filPart)
+            raise IOError("Different checksum for file {name} - XML metadata:"
+                          " {orig}, downloaded: {down}".format(
+                              name=filDown, orig=info['Checksum'],
+                              down=checksum))
+        with self._lock:
+            self._checksums[filDown] = checksum
+        return checksum
+
+    def _validateFile(self, filDown, filPart, info, hasher):
+        """Validate a downloaded file before it is renamed to its final
+           name, with the XML metadata if available, otherwise opening it
+           with GDAL. The file is removed if it is not valid
+
+           :param str filDown: name of the downloaded file
+           :param str filPart: the downloaded partial file
+           :param dict info: the values returned by _sidecarInfo
+           :param hasher: the object computing the checksum
+        """
+        # XML files are not checked
+        if filDown.find('.xml') != -1:
+            return
+        if info:
+            self._verifyChecksum(filDown, filPart, info, hasher)
+            if self.debug:
+                logging.debug("File {name} verified with XML "
+                              "metadata".format(name=filDown))
+        # if GDAL cannot open the file, delete it and redownload
+        elif GDAL and self.checkFile(filPart):
+            os.remove(filPart)
+            raise IOError("File {name} is not a valid HDF "
+                          "file".format(name=filDown))
+
+    def _partSize(self, filPart):
+        """Return the number of bytes already downloaded in a partial file
+
+           :param str filPart: the path to the partial file
+        """
+        if os.path.exists(filPart):
+            return os.path.getsize(filPart)
+        return 0
+
+    def _removeEmptyPart(self, filHdf):
+        """Remove the partial file of a failed download if it is empty
+
+           :param str filHdf: name of the file that was going to be written
+        """
+        filPart = filHdf + '.part'
+        if os.path.exists(filPart) and self._partSize(filPart) == 0:
+            os.remove(filPart)
+
+    def _reserveSpace(self, filSave, orig_size, wait=True):
+        """Reserve the free space for the rest of a file and allocate it on
+           the disk, see DiskSpace
+
+           :param filSave: the partial file object, opened in append mode
+           :param orig_size: the size of the remote file or None
+           :param bool wait: False to return None immediately if the space
+                             is not available
+
+           :return: a context manager keeping the reservation until the end
+                    of the transfer
+        """
+        if not self.diskspace:
+            return contextlib.nullcontext()
+        filSave.seek(0, os.SEEK_END)
+        size = int(orig_size) - filSave.tell() if orig_size else 0
+        space = self.diskspace.reserve(size, wait)
+        if space and self.diskspace.allocate and \
+                preallocate(filSave, filSave.tell(), size):
+            # the allocated blocks are already counted as used space
+            space.release()
+        return space
+
+    def _resumeFile(self, filSave, status, headers, offset):
+        """Prepare the partial file to receive the data of a HTTP response
+           and return the size of the whole remote file
+
+           :param filSave: the partial file object, opened in append mode
+           :param int status: the status code of the HTTP response
+           :param headers: the headers of the HTTP response
+           :param int offset: the number of bytes requested to be skipped
+
+           :return: the size of the remote file as string or None
+        """
+        crange = headers.get('Content-Range', '')
+        if offset and status == 206:
+            # the server accepted the range, new data are appended
+            if '/' in crange and not crange.endswith('/*'):
+                return crange.split('/')[-1]
+            if headers.get('Content-Length'):
+                return str(offset + int(headers['Content-Length']))
+            return None
+        elif offset and status == 416:
+            # the partial file could already contain the whole file
+            if crange.endswith('/{off}'.format(off=offset)):
+                return str(offset)
+            filSave.seek(0)
+            filSave.truncate()
+            raise IOError("Range not satisfiable, the download will restart")
+        elif offset:
+            logging.warning("The server refused to resume the download, "
+                            "restarting it from the beginning")
+            filSave.seek(0)
+            filSave.truncate()
+        return headers.get('Content-Length')
 
     def _downloadFileHTTP(self, filDown, filHdf, day):
-        """Download a single file from the http server
+        """Download a single file from the http server, failed attempts are
+           repeated following the retry policy
+
+           :param str filDown: name of the file to download
+           :param str filHdf: name of the file to write to
+           :param str day: the day in format YYYY.MM.DD
+
+           :return: 0 if file is downloaded, 1 for error
+        """
+        info = None
+        if self.checksum and filDown.endswith('.hdf'):
+            info = self._sidecarInfo(filDown, day)
+        try:
+            return self.retry.call(self._transferFileHTTP,
+                                   (filDown, filHdf, day, info), what=filDown)
+        except RetryPolicy.ERRORS as e:
+            logging.error("Cannot download {name}, the error was "
+                          "'{err}'".format(name=filDown, err=e))
+            self._removeEmptyPart(filHdf)
+            return 1
+
+    def _transferFileHTTP(self, filDown, filHdf, day, info=None):
+        """Make one attempt to download a single file from the http server.
+           The data are streamed in chunks of self.chunksize bytes to a
+           temporary '.part' file, renamed to filHdf only when the download
+           is complete. If the '.part' file already exists the download is
+           resumed using the HTTP Range header
 
            :param str filDown: name of the file to download
            :param str filHdf: name of the file to write to
            :param str day: the day in format YYYY.MM.DD
+           :param dict info: the values of the XML metadata used to verify
+                             the file, returned by _sidecarInfo
         """
-        filSave = open(filHdf, "wb")
+        filPart = filHdf + '.part'
         url = urljoin(self.url, self.path, day, filDown)
-        orig_size = None
-        try:  # download and write the file
-            req = urllib.request.Request(url, headers=self.http_header)
-            http = urllib.request.urlopen(req)
-            orig_size = http.headers['Content-Length']
-            filSave.write(http.read())
-        # if local file has an error, try to download the file again
-        except Exception as e:
-            logging.warning("Tried to downlaod with urllib but got this "
-                            "error {co}, reason {re}".format(co=e.code,
-                                                             re=e.reason))
-            try:
-                http = requests.get(url, timeout=self.timeout)
-                orig_size = http.headers['Content-Length']
-                filSave.write(http.content)
-            except Exception as e:
-                logging.warning("Tried to downlaod with requests but got this "
-                                "error {co}, reason {re}".format(co=e.code,
-                                                                 re=e.reason))
-                logging.error("Cannot download {name}. "
-                              "Retrying...".format(name=filDown))
-                filSave.close()
-                os.remove(filSave.name)
-                import time
-                time.sleep(5)
-                self._downloadFileHTTP(filDown, filHdf, day)
-        filSave.close()
-        transf_size = os.path.getsize(filSave.name)
+        # the bytes missing on the disk, known after a response
+        need = 0
+        while True:
+            # the new transfers wait while the disk is full
+            if self.diskspace:
+                self.diskspace.wait(need)
+            orig_size = None
+            offset = self._partSize(filPart)
+            headers = {}
+            if offset:
+                headers['Range'] = 'bytes={off}-'.format(off=offset)
+                if self.debug:
+                    logging.debug("Resume download of {name} from byte "
+                                  "{off}".format(name=filDown, off=offset))
+            self._waitRequest()
+            self.metrics.request()
+            # download and write the file, the partial file is kept on
+            # error to resume the download
+            with open(filPart, "ab") as filSave, self._hostSlot(url), \
+                    self.session.get(url, timeout=self.timeout,
+                                     headers=headers, stream=True) as http:
+                self.metrics.update(code=http.status_code)
+                if http.status_code != 416:
+                    http.raise_for_status()
+                orig_size = self._resumeFile(filSave, http.status_code,
+                                             http.headers, offset)
+                hasher = self._startChecksum(info, filPart, filSave.tell())
+                if http.status_code == 416:
+                    break
+                space = self._reserveSpace(filSave, orig_size, wait=False)
+                if space is None:
+                    # the connection is closed while waiting for space
+                    need = 0
+                    if orig_size is not None:
+                        need = int(orig_size) - filSave.tell()
+                    continue
+                with space:
+                    self._writeChunks(http.iter_content(self.chunksize),
+                                      filSave, hasher)
+            break
+        return self._completeFile(filDown, filHdf, orig_size, info, hasher)
+
+    def _completeFile(self, filDown, filHdf, orig_size, info, hasher):
+        """Check the size of a downloaded partial file and rename it to
+           its final name, an error is raised if the file is not complete
+
+           :param str filDown: name of the downloaded file
+           :param str filHdf: name of the file to write to
+           :param str orig_size: the size of the remote file or None
+           :param dict info: the values returned by _sidecarInfo
+           :param hasher: the object computing the checksum
+
+           :return: 0 if the file is complete
+        """
+        filPart = filHdf + '.part'
+        transf_size = os.path.getsize(filPart)
         if not orig_size:
-            self.filelist.write("{name}\n".format(name=filDown))
-            self.filelist.flush()
+            # without the size of the server only the XML metadata can
+            # verify the file
+            if info:
+                self._validateFile(filDown, filPart, info, hasher)
+            os.replace(filPart, filHdf)
+            self._writeFilelist(filDown)
             if self.debug:
                 logging.debug("File {name} downloaded but not "
                               "check the size".format(name=filDown))
             return 0
-        if int(orig_size) == int(transf_size):
-            # if no xml file, delete the HDF and redownload
-            if filHdf.find('.xml') == -1:
-                test = False
-                if GDAL:
-                    test = self.checkFile(filHdf)
-                if test:
-                    os.remove(filSave.name)
-                    self._downloadFileHTTP(filDown, filHdf, day)
-                else:
-                    self.filelist.write("{name}\n".format(name=filDown))
-                    self.filelist.flush()
-                    if self.debug:
-                        logging.debug("File {name} downloaded "
-                                      "correctly".format(name=filDown))
-                    return 0
-            else:  # xml exists
-                self.filelist.write("{name}\n".format(name=filDown))
-                self.filelist.flush()
-                if self.debug:
-                    logging.debug("File {name} downloaded "
-                                  "correctly".format(name=filDown))
-                return 0
-        # if filesizes are different, delete and try again
-        else:
-            logging.warning("Different size for file {name} - original data: "
-                            "{orig}, downloaded: {down}".format(name=filDown,
-                                                                orig=orig_size,
-                                                                down=transf_size))
-            os.remove(filSave.name)
-            self._downloadFileHTTP(filDown, filHdf, day)
+        # if filesizes are different, resume or delete and try again
+        if int(orig_size) != int(transf_size):
+            if int(transf_size) > int(orig_size):
+                os.remove(filPart)
+            raise IOError("Different size for file {name} - original data: "
+                          "{orig}, downloaded: {down}".format(
+                              name=filDown, orig=orig_size, down=transf_size))
+        self._validateFile(filDown, filPart, info, hasher)
+        os.replace(filPart, filHdf)
+        self._writeFilelist(filDown)
+        if self.debug:
+            logging.debug("File {name} downloaded "
+                          "correctly".format(name=filDown))
+        return 0
 
-    def _downloadFileFTP(self, filDown, filHdf):
-        """Download a single file from ftp server
+    def _downloadFileFTP(self, filDown, filHdf, day=None):
+        """Download a single file from ftp server, failed attempts are
+           repeated following the retry policy
 
            :param str filDown: name of the file to download
            :param str filHdf: name of the file to write to
+           :param str day: the day in format YYYY.MM.DD, None for the
+                           directory entered by setDirectoryIn
+
+           :return: 0 if file is downloaded, 1 for error
         """
-        filSave = open(filHdf, "wb")
-        try:  # transfer file from ftp
-            self.ftp.retrbinary("RETR " + filDown, filSave.write)
-            self.filelist.write("{name}\n".format(name=filDown))
-            self.filelist.flush()
-            if self.debug:
-                logging.debug("File {name} downloaded".format(name=filDown))
-        # if error during download process, try to redownload the file
-        except (ftplib.error_reply, socket.error, ftplib.error_temp,
-                EOFError) as e:
-            logging.error("Cannot download {name}, the error was '{err}'. "
-                          "Retrying...".format(name=filDown, err=e))
-            filSave.close()
-            os.remove(filSave.name)
-            try:
-                self.ftp.pwd()
-            except (ftplib.error_temp, EOFError) as e:
-                self._connectFTP()
-            self._downloadFileFTP(filDown, filHdf)
-        filSave.close()
-        orig_size = self.ftp.size(filDown)
-        transf_size = os.path.getsize(filSave.name)
-        if orig_size == transf_size:
-            return 0
-        else:
-            logging.warning("Different size for file {name} - original data: "
-                            "{orig}, downloaded: {down}".format(name=filDown,
-                                                                orig=orig_size,
-                                                                down=transf_size))
-            os.remove(filSave.name)
-            self._downloadFileFTP(filDown, filHdf)
+        if day is None:
+            day = self._ftpday
+        info = None
+        if self.checksum and filDown.endswith('.hdf'):
+            info = self._sidecarInfo(filDown, day)
+
+        def transfer():
+            """Make one attempt with a connection of the pool, a lost
+               connection is replaced at the next attempt"""
+            self._waitRequest()
+            with self.ftppool.connection(day) as ftp:
+                return self._transferFileFTP(ftp, filDown, filHdf, info)
+
+        try:
+            return self.retry.call(transfer, what=filDown)
+        except RetryPolicy.ERRORS as e:
+            logging.error("Cannot download {name}, the error was "
+                          "'{err}'".format(name=filDown, err=e))
+            self._removeEmptyPart(filHdf)
+            return 1
+
+    def _transferFileFTP(self, ftp, filDown, filHdf, info=None):
+        """Make one attempt to download a single file from ftp server. The
+           data are written to a temporary '.part' file, renamed to filHdf
+           only when the download is complete. If the '.part' file already
+           exists the download is resumed using the FTP REST command
+
+           :param ftp: the FTP connection inside the directory of the day
+           :param str filDown: name of the file to download
+           :param str filHdf: name of the file to write to
+           :param dict info: the values of the XML metadata used to verify
+                             the file, returned by _sidecarInfo
+        """
+        filPart = filHdf + '.part'
+        offset = self._partSize(filPart)
+
+        def write(chunk):
+            """Write the data and update the checksum"""
+            if self.ratelimit:
+                self.ratelimit.acquire(len(chunk))
+            self.metrics.count(len(chunk))
+            filSave.write(chunk)
+            if hasher:
+                hasher.update(chunk)
+
+        self.metrics.request()
+        # transfer file from ftp, the partial file is kept on error to
+        # resume the download
+        with open(filPart, "ab") as filSave:
+            # SIZE is refused in ASCII mode by several servers
+            ftp.voidcmd('TYPE I')
+            orig_size = ftp.size(filDown)
+            if offset and orig_size is not None and offset > orig_size:
+                filSave.truncate(0)
+                offset = 0
+            hasher = self._startChecksum(info, filPart, offset)
+            # the transfer waits for free space keeping the connection
+            with self._reserveSpace(filSave, orig_size):
+                if offset and offset == orig_size:
+                    # the partial file already contains the whole file
+                    pass
+                elif offset:
+                    if self.debug:
+                        logging.debug("Resume download of {name} from "
+                                      "byte {off}".format(name=filDown,
+                                                          off=offset))
+                    try:
+                        ftp.retrbinary("RETR " + filDown, write,
+                                       blocksize=self.chunksize, rest=offset)
+                    except (ftplib.error_perm, ftplib.error_reply) as e:
+                        logging.warning("The server refused to resume the "
+                                        "download ({err}), restarting it "
+                                        "from the beginning".format(err=e))
+                        filSave.truncate(0)
+                        hasher = self._startChecksum(info, filPart, 0)
+                        ftp.retrbinary("RETR " + filDown, write,
+                                       blocksize=self.chunksize)
+                else:
+                    ftp.retrbinary("RETR " + filDown, write,
+                                   blocksize=self.chunksize)
+        transf_size = os.path.getsize(filPart)
+        if orig_size != transf_size:
+            if orig_size is None or transf_size > orig_size:
+                os.remove(filPart)
+            raise IOError("Different size for file {name} - original data: "
+                          "{orig}, downloaded: {down}".format(
+                              name=filDown, orig=orig_size, down=transf_size))
+        if info:
+            self._validateFile(filDown, filPart, info, hasher)
+        os.replace(filPart, filHdf)
+        self._writeFilelist(filDown)
+        if self.debug:
+            logging.debug("File {name} downloaded".format(name=filDown))
+        return 0
 
     def dayDownload(self, day, listFilesDown):
         """Downloads tiles for the selected day
@@ -820,48 +2865,145 @@ class downModis:
            :param list listFilesDown: list of the files to download, returned
                                       by checkDataExist function
         """
+        # the XML files are downloaded first, to verify the HDF files
+        if self.checksum:
+            listFilesDown = sorted(listFilesDown,
+                                   key=lambda name: not name.endswith('.xml'))
+        # download the files in parallel
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = self._submitFiles(pool, day, listFilesDown)
+                for fut in as_completed(futures):
+                    fut.result()
+            return
         # for each file in files' list
         for i in listFilesDown:
-            fileSplit = i.split('.')
-            filePrefix = "{a}.{b}.{c}.{d}".format(a=fileSplit[0],
-                                                  b=fileSplit[1],
-                                                  c=fileSplit[2],
-                                                  d=fileSplit[3])
+            self._fileDownload(day, i)
+
+    def _fileTasks(self, day, listFilesDown):
+        """Return the arguments of _fileDownload for the files of a day,
+           in the order they have to be submitted to a pool of threads.
+           With the checksum the XML files come first and each HDF file
+           waits for its XML file, so the XML file is read from the disk
+           instead of being requested again. The pool must run the tasks in
+           the order they are submitted, or the XML file is already taken
+           by a thread when the HDF file waits for it
+
+           :param str day: the day in format YYYY.MM.DD
+           :param list listFilesDown: list of the files to download
+
+           :return: a list of tuples (day, fileName, after, done)
+        """
+        if not self.checksum:
+            return [(day, i, None, None) for i in listFilesDown]
+        xmls = dict((i, threading.Event()) for i in listFilesDown
+                    if i.endswith('.xml'))
+        tasks = [(day, i, None, done) for i, done in xmls.items()]
+        tasks.extend((day, i, xmls.get(i + '.xml'), None)
+                     for i in listFilesDown if not i.endswith('.xml'))
+        return tasks
+
+    def _submitFiles(self, pool, day, listFilesDown):
+        """Submit the downloads of the files of a day to a pool of threads,
+           see _fileTasks
+
+           :param pool: the ThreadPoolExecutor object
+           :param str day: the day in format YYYY.MM.DD
+           :param list listFilesDown: list of the files to download
+
+           :return: the list of the futures of the downloads
+        """
+        return [pool.submit(self._fileDownload, *task)
+                for task in self._fileTasks(day, listFilesDown)]
+
+    def _fileDownload(self, day, fileName, after=None, done=None):
+        """Download a single file of the selected day if a newer version of
+           it is not already in the save directory
+
+           :param str day: the day in format YYYY.MM.DD
+           :param str fileName: the name of the file to download
+           :param after: a threading.Event to wait before the download,
+                         see _fileTasks
+           :param done: a threading.Event set at the end of the download
+        """
+        # an error is counted unless the file is skipped or downloaded
+        result = 1
+        if after is not None:
+            after.wait()
+        try:
+            file_hdf = self._prepareDownload(fileName)
+            if file_hdf:
+                result = self.downloadFile(fileName, file_hdf, day)
+            else:
+                result = None
+        finally:
+            if done is not None:
+                done.set()
+            self._fileDone(day, result)
+
+    def _prepareDownload(self, fileName):
+        """Check if a file has to be downloaded, comparing it with the
+           version in the save directory. An older local version is removed
+
+           :param str fileName: the name of the file to download
 
+           :return: the path where the file has to be written, None if it
+                    must not be downloaded
+        """
+        # the check of the local version has to be atomic between threads
+        with self._lock:
             # check if this file already exists in the save directory
-            oldFile = glob.glob1(self.writeFilePath, filePrefix + "*"
-                                 + fileSplit[-1])
+            oldFile = self._indexLookup(fileName)
             numFiles = len(oldFile)
             # if it doesn't exist
             if numFiles == 0:
-                file_hdf = os.path.join(self.writeFilePath, i)
+                return os.path.join(self.writeFilePath, fileName)
             # if one does exist
             elif numFiles == 1:
                 # check the version of file, delete local file if it is older
-                fileDown = getNewerVersion(oldFile[0], i)
-                if fileDown != oldFile[0]:
+                # or if the database knows it is not complete
+                fileDown = getNewerVersion(oldFile[0], fileName)
+                if fileDown != oldFile[0] or (
+                        self.state and fileDown == fileName and
+                        not self.state.isComplete(fileName)):
                     os.remove(os.path.join(self.writeFilePath, oldFile[0]))
-                    file_hdf = os.path.join(self.writeFilePath, fileDown)
+                    self._indexRemove(oldFile[0])
+                    if self.state:
+                        self.state.remove(oldFile[0])
+                    return os.path.join(self.writeFilePath, fileDown)
             elif numFiles > 1:
                 logging.error("There are to many files for "
-                              "{name}".format(name=i))
-            if numFiles == 0 or (numFiles == 1 and fileDown != oldFile[0]):
-                self.downloadFile(i, file_hdf, day)
+                              "{name}".format(name=fileName))
+        return None
+
+    def _selectDays(self, allDays=False, windows=None):
+        """Return the days to download
 
-    def downloadsAllDay(self, clean=False, allDays=False):
+           :param bool allDays: all the days on the server
+           :param list windows: the periods to download, see getDaysWindows
+        """
+        if allDays:
+            return self.getAllDays()
+        elif windows:
+            return self.getDaysWindows(windows)
+        return self.getListDays()
+
+    def downloadsAllDay(self, clean=False, allDays=False, windows=None):
         """Download all requested days
 
            :param bool clean: if True remove the empty files, they could have
                               some problems in the previous download
            :param bool allDays: download all passable days
+           :param list windows: download only the days of these periods, a
+                                list of tuples (start, end), see
+                                getDaysWindows and yearlyWindows
+
+           :return: the summary of the metrics, see DownloadMetrics.summary
         """
         if clean:
             self.removeEmptyFiles()
         # get the days to download
-        if allDays:
-            days = self.getAllDays()
-        else:
-            days = self.getListDays()
+        days = self._selectDays(allDays, windows)
         # log the days to download
         if self.debug:
             logging.debug("The number of days to download is: "
@@ -871,41 +3013,144 @@ class downModis:
             self._downloadAllDaysHTTP(days)
         elif self.urltype == 'ftp':
             self._downloadAllDaysFTP(days)
+        return self.metrics.summary()
 
     def _downloadAllDaysHTTP(self, days):
         """Downloads all the tiles considered from HTTP server
 
            :param list days: the list of days to download
         """
-        # for each day
-        for day in days:
-            # obtain list of all files
-            listAllFiles = self.getFilesList(day)
-            # filter files based on local files in save directory
-            listFilesDown = self.checkDataExist(listAllFiles)
-            # download files for a day
-            self.dayDownload(day, listFilesDown)
+        if self.workers > 1:
+            self._downloadAllDaysParallel(days)
+        else:
+            # for each day
+            for day in days:
+                # obtain list of all files
+                listAllFiles = self.getFilesList(day)
+                # filter files based on local files in save directory
+                listFilesDown = self.checkDataExist(listAllFiles)
+                self._startDay(day, listAllFiles, listFilesDown)
+                # download files for a day
+                self.dayDownload(day, listFilesDown)
+        if self.listcache:
+            self.listcache.save()
         self.closeFilelist()
         if self.debug:
             logging.debug("Download terminated")
         return 0
 
+    def _downloadAllDaysParallel(self, days, listing=None):
+        """Downloads all the tiles considered, the lists of files and the
+           files of all days share the same pool of self.workers threads
+
+           :param list days: the list of days to download
+           :param listing: the function returning the files of a day,
+                           None for getFilesList
+        """
+        listing = listing or self.getFilesList
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            listings = dict((pool.submit(listing, day), day)
+                            for day in days)
+            downloads = []
+            # schedule the files of a day as soon as its list is available
+            for fut in as_completed(listings):
+                day = listings[fut]
+                listAllFiles = fut.result()
+                listFilesDown = self.checkDataExist(listAllFiles)
+                self._startDay(day, listAllFiles, listFilesDown)
+                if self.debug:
+                    logging.debug("Scheduled {num} files for day "
+                                  "{day}".format(num=len(listFilesDown),
+                                                 day=day))
+                downloads.extend(self._submitFiles(pool, day,
+                                                   listFilesDown))
+            for fut in as_completed(downloads):
+                fut.result()
+
+    def downloadGranules(self, granules):
+        """Download some granules, the list of files of each day is
+           requested only once and the files are downloaded by self.workers
+           threads. connect must be called before, the file list is not
+           closed so the method can be called again
+
+           :param list granules: a list of tuples (day, tile), the day as
+                                 datetime.date or string in format
+                                 YYYY-MM-DD, the tile in format hXXvYY or
+                                 None for all the tiles of the day
+
+           :return: the list of the granules not downloaded, the ones not
+                    found on the server and the ones with a HDF file that
+                    failed and is not in the save directory
+        """
+        index = self.getDateIndex()
+        # the requested granules of each day on the server
+        requested = {}
+        missing = []
+        for day, tile in granules:
+            name = index.get(day)
+            if name is None:
+                missing.append((day, tile))
+            else:
+                requested.setdefault(name, []).append((day, tile))
+        found = {}
+        # the HDF files of each day, to check the failed downloads
+        hdfs = {}
+
+        def listing(day):
+            """Return the files of the requested tiles of a day"""
+            tiles = set(tile for _, tile in requested[day])
+            files = []
+            found[day] = set()
+            hdfs[day] = []
+            for name in self.getFilesList(day):
+                record = GranuleName.parse(name)
+                if record and (None in tiles or record.tile in tiles):
+                    files.append(name)
+                    found[day].add(record.tile)
+                    if record.extension == 'hdf' and not record.browse:
+                        hdfs[day].append(record)
+            return files
+
+        days = sorted(requested, reverse=True)
+        if self.debug:
+            logging.debug("The number of days to download is: "
+                          "{num}".format(num=len(days)))
+        self._downloadAllDaysParallel(days, listing)
+        if self.listcache:
+            self.listcache.save()
+        for day in days:
+            # the tiles without the HDF file after the download
+            with self._lock:
+                failed = set(rec.tile for rec in hdfs.get(day, ())
+                             if not self._indexLookup(rec.name))
+            for granule in requested[day]:
+                tile = granule[1]
+                if not found.get(day) or (tile and tile not in found[day]):
+                    missing.append(granule)
+                elif tile in failed or (not tile and failed):
+                    missing.append(granule)
+        return missing
+
     def _downloadAllDaysFTP(self, days):
         """Downloads all the tiles considered from FTP server
 
            :param list days: the list of days to download
         """
-        # for each day
-        for day in days:
-            # enter in the directory of day
-            self.setDirectoryIn(day)
-            # obtain list of all files
-            listAllFiles = self.getFilesList()
-            # filter files based on local files in save directory
-            listFilesDown = self.checkDataExist(listAllFiles)
-            # download files for a day
-            self.dayDownload(day, listFilesDown)
-            self.setDirectoryOver()
+        if self.workers > 1:
+            self._downloadAllDaysParallel(days)
+        else:
+            # for each day
+            for day in days:
+                # enter in the directory of day
+                self.setDirectoryIn(day)
+                # obtain list of all files
+                listAllFiles = self.getFilesList()
+                # filter files based on local files in save directory
+                listFilesDown = self.checkDataExist(listAllFiles)
+                self._startDay(day, listAllFiles, listFilesDown)
+                # download files for a day
+                self.dayDownload(day, listFilesDown)
+                self.setDirectoryOver()
         self.closeFTP()
         if self.debug:
             logging.debug("Download terminated")
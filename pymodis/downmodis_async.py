@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+#  class to download modis data with asyncio
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to download MODIS HDF files from NASA HTTP repository using
+asyncio, thousands of listings and files can be requested at the same
+time from a single thread. It requires the aiohttp library
+
+Classes:
+
+* :class:`AsyncDownModis`
+
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import time
+from urllib.parse import urljoin as joinurl
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+import aiohttp
+
+from .downmodis import downModis
+from .downmodis import getDataFiles
+from .downmodis import modisHtmlParser
+from .downmodis import RetryPolicy
+from .downmodis import urljoin
+
+#: the HTTP status codes of the redirects
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+class AsyncDownModis(downModis):
+    """A class to download MODIS data from NASA HTTP repositories with
+       asyncio. It accepts the same parameters of :class:`downModis`, the
+       methods starting with 'a' are the coroutines corresponding to the
+       methods of downModis; connect and downloadsAllDay run them in a new
+       event loop. The network is handled by the event loop, the work on
+       the disk (writes, checksums, database and GDAL check) runs in the
+       default executor
+
+       :param int concurrency: maximum number of HTTP requests in flight
+    """
+    #: the errors retried following the retry policy
+    ERRORS = RetryPolicy.ERRORS + (aiohttp.ClientError,
+                                   asyncio.TimeoutError)
+    #: maximum number of redirects followed by a request
+    MAXREDIRECTS = 10
+
+    def __init__(self, destinationFolder, *args, concurrency=100, **kwargs):
+        """Function to initialize the object"""
+        downModis.__init__(self, destinationFolder, *args, **kwargs)
+        if self.urltype != 'http':
+            raise IOError("AsyncDownModis supports only HTTP servers")
+        self.concurrency = max(1, int(concurrency))
+        # connections to the same host, 0 means no limit
+        self._hostlimit = kwargs.get('hostconn') or 0
+        # aiohttp session and semaphore, they are bound to the event loop
+        self._asession = None
+        self._semaphore = None
+
+    async def _getSession(self):
+        """Return the aiohttp session, it is created in the running event
+           loop at the first request"""
+        if self._asession is None or self._asession.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                             limit_per_host=self._hostlimit)
+            timeout = aiohttp.ClientTimeout(total=None,
+                                            sock_connect=self.timeout,
+                                            sock_read=self.timeout)
+            # unsafe is required to store the cookies of IP addresses
+            self._asession = aiohttp.ClientSession(
+                connector=connector, timeout=timeout,
+                cookie_jar=aiohttp.CookieJar(unsafe=True))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._asession
+
+    async def _inThread(self, func, *args):
+        """Run a blocking function, like the disk writes, the checksums,
+           the database updates and the GDAL check, in the default executor
+           so the event loop is not stopped. The function sees the context
+           variables of the task, like the transfer of DownloadMetrics
+
+           :param func: the function to run
+           :param args: the arguments of the function
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(context.run, func, *args))
+
+    def _saveChunk(self, filSave, chunk, hasher=None):
+        """Write a chunk of data and update the checksum
+
+           :param filSave: the file object to write to
+           :param bytes chunk: the data
+           :param hasher: an object updating the checksum with the data
+        """
+        filSave.write(chunk)
+        if hasher:
+            hasher.update(chunk)
+
+    async def aclose(self):
+        """Close the aiohttp session"""
+        if self._asession is not None:
+            await self._asession.close()
+            self._asession = None
+
+    @contextlib.asynccontextmanager
+    async def _request(self, url, headers=None):
+        """Send a GET request and return the response. The redirects are
+           followed here to send the authentication header only to the
+           authentication hosts, like ModisSession does
+
+           :param str url: the url to request
+           :param dict headers: the additional headers of the request
+        """
+        session = await self._getSession()
+        if self.requestlimit:
+            await asyncio.sleep(self.requestlimit.reserve())
+        async with self._semaphore:
+            for _ in range(self.MAXREDIRECTS):
+                hdrs = dict(headers or {})
+                if urlparse(url).hostname in self.session.authhosts:
+                    hdrs.update(self.http_header)
+                resp = await session.get(url, headers=hdrs,
+                                         allow_redirects=False)
+                if resp.status not in REDIRECTS:
+                    break
+                url = joinurl(url, resp.headers.get('Location', ''))
+                resp.release()
+            else:
+                raise IOError("Too many redirects for {url}".format(url=url))
+            try:
+                yield resp
+            finally:
+                resp.release()
+
+    def _retriable(self, error):
+        """Return True if the error is worth a new attempt
+
+           :param error: the exception raised by the operation
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.retry.statuses
+        return self.retry.retriable(error)
+
+    async def _retry(self, func, args=(), attempts=None, what=None):
+        """Await a coroutine function until it succeeds or the retry policy
+           gives up, see RetryPolicy.call
+
+           :param func: the coroutine function to execute
+           :param tuple args: the positional arguments of the function
+           :param int attempts: overwrite the maximum number of attempts
+           :param str what: description of the operation for the log
+        """
+        if attempts is None:
+            attempts = self.retry.attempts
+        if what is None:
+            what = getattr(func, '__name__', str(func))
+        start = time.time()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.retry.started(attempt)
+            try:
+                return await func(*args)
+            except self.ERRORS as e:
+                if not self._retriable(e):
+                    attempts = attempt
+                await asyncio.sleep(self.retry.failed(e, attempt, attempts,
+                                                      start, what))
+
+    async def _agetIndex(self, url, day=None, strict=False):
+        """Return the parsed directory index of an url, see _getIndex
+
+           :param str url: the url of the directory
+           :param str day: the day of the directory in format YYYY.MM.DD,
+                           None for the product directory
+           :param bool strict: True to raise an error for every HTTP error
+                               status, otherwise only for the statuses
+                               worth a new attempt
+
+           :return: a modisHtmlParser object
+        """
+        entry = None
+        headers = {}
+        if self.listcache:
+            entry = self.listcache.get(url)
+            if entry and self.listcache.isFresh(entry, day):
+                self.metrics.addListing(url, 0.0, cached=True)
+                return modisHtmlParser(None, fileids=entry['links'])
+            if entry and entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry['modified']:
+                headers['If-Modified-Since'] = entry['modified']
+        start = time.time()
+        async with self._request(url, headers) as resp:
+            self.metrics.addListing(url, time.time() - start, resp.status)
+            if entry and resp.status == 304:
+                self.listcache.touch(url)
+                return modisHtmlParser(None, fileids=entry['links'])
+            if strict or resp.status in self.retry.statuses:
+                resp.raise_for_status()
+            parser = modisHtmlParser(await resp.read())
+        if self.listcache and resp.status == 200:
+            self.listcache.put(url, parser.get_all(),
+                               resp.headers.get('ETag'),
+                               resp.headers.get('Last-Modified'))
+        return parser
+
+    async def aconnect(self, ncon=20):
+        """Connect to the server and fill the dirData variable
+
+           :param int ncon: maximum number of attempts to connect to the HTTP
+                            server before failing
+        """
+        if self.search:
+            # the few requests of the granule search are done in a thread
+            await self._inThread(self._connectSearch, ncon)
+            if len(self.dirData) == 0:
+                raise Exception("There are some troubles with the server. "
+                                "The directory seems to be empty")
+            return
+        url = urljoin(self.url, self.path)
+
+        async def index():
+            """Return the list of directories"""
+            self.nconnection += 1
+            return (await self._agetIndex(url, strict=True)).get_dates()
+
+        try:
+            self.dirData = await self._retry(index, attempts=ncon, what=url)
+            self.dirData.reverse()
+            if self.listcache:
+                self.listcache.save()
+        except self.ERRORS as e:
+            logging.error('Error {er}'.format(er=e))
+        if len(self.dirData) == 0:
+            raise Exception("There are some troubles with the server. "
+                            "The directory seems to be empty")
+
+    async def agetFilesList(self, day):
+        """Returns a list of files to download, see getFilesList
+
+           :param str day: the date of data in format YYYY.MM.DD
+
+           :return: a list of files to download for the day
+        """
+        if self._searchFiles is not None:
+            return self.getFilesList(day)
+        url = urljoin(self.url, self.path, day)
+        if self.debug:
+            logging.debug("The url is: {url}".format(url=url))
+        try:
+            http = await self._retry(self._agetIndex, (url, day), what=url)
+        except self.ERRORS as e:
+            logging.error("Error {err} when try to receive list of "
+                          "files".format(err=e))
+            return []
+        return self._selectFiles(http)
+
+    async def adayDownload(self, day, listFilesDown):
+        """Downloads tiles for the selected day, all the files at the same
+           time
+
+           :param str day: the day in format YYYY.MM.DD
+           :param list listFilesDown: list of the files to download, returned
+                                      by checkDataExist function
+        """
+        # the XML files are downloaded first, to verify the HDF files
+        if self.checksum:
+            xmls = [i for i in listFilesDown if i.endswith('.xml')]
+            await asyncio.gather(*[self._afileDownload(day, i)
+                                   for i in xmls])
+            listFilesDown = [i for i in listFilesDown
+                             if not i.endswith('.xml')]
+        await asyncio.gather(*[self._afileDownload(day, i)
+                               for i in listFilesDown])
+
+    async def _afileDownload(self, day, fileName):
+        """Download a single file of the selected day if a newer version of
+           it is not already in the save directory
+
+           :param str day: the day in format YYYY.MM.DD
+           :param str fileName: the name of the file to download
+        """
+        # an error is counted unless the file is skipped or downloaded
+        result = 1
+        try:
+            file_hdf = await self._inThread(self._prepareDownload, fileName)
+            if file_hdf:
+                result = await self.adownloadFile(fileName, file_hdf, day)
+            else:
+                result = None
+        finally:
+            await self._inThread(self._fileDone, day, result)
+
+    async def adownloadFile(self, filDown, filHdf, day):
+        """Download a single file, failed attempts are repeated following
+           the retry policy
+
+           :param str filDown: name of the file to download
+           :param str filHdf: name of the file to write to
+           :param str day: the day in format YYYY.MM.DD
+
+           :return: 0 if file is downloaded, 1 for error
+        """
+        if self.state:
+            await self._inThread(self.state.start, filDown)
+        self.metrics.begin(filDown, day)
+        info = None
+        if self.checksum and filDown.endswith('.hdf'):
+            info = await self._asidecarInfo(filDown, day)
+        try:
+            result = await self._retry(self._atransferFile,
+                                       (filDown, filHdf, day, info),
+                                       what=filDown)
+        except self.ERRORS as e:
+            logging.error("Cannot download {name}, the error was "
+                          "'{err}'".format(name=filDown, err=e))
+            self._removeEmptyPart(filHdf)
+            result = 1
+        await self._inThread(self._finishFile, filDown, filHdf, result, day)
+        return result
+
+    async def _asidecarInfo(self, filDown, day):
+        """Return the values of the DataFileContainer element of the XML
+           metadata file of a HDF file, see _sidecarInfo
+
+           :param str filDown: name of the HDF file
+           :param str day: the day in format YYYY.MM.DD
+        """
+        xmlname = filDown + '.xml'
+        if os.path.exists(os.path.join(self.writeFilePath, xmlname)):
+            return await self._inThread(self._sidecarInfo, filDown, day)
+        url = urljoin(self.url, self.path, day, xmlname)
+        try:
+            async with self._request(url) as resp:
+                resp.raise_for_status()
+                content = await resp.read()
+            return getDataFiles(content, filDown) or None
+        except (ElementTree.ParseError,) + self.ERRORS as e:
+            logging.warning("Cannot read the XML file of {name}, the error "
+                            "was '{err}'".format(name=filDown, err=e))
+            return None
+
+    async def _atransferFile(self, filDown, filHdf, day, info=None):
+        """Make one attempt to download a single file, streamed to a
+           '.part' file and resumed like in _transferFileHTTP
+
+           :param str filDown: name of the file to download
+           :param str filHdf: name of the file to write to
+           :param str day: the day in format YYYY.MM.DD
+           :param dict info: the values of the XML metadata used to verify
+                             the file, returned by _sidecarInfo
+        """
+        filPart = filHdf + '.part'
+        url = urljoin(self.url, self.path, day, filDown)
+        # the bytes missing on the disk, known after a response
+        need = 0
+        while True:
+            # the new transfers wait while the disk is full
+            if self.diskspace:
+                await self._inThread(self.diskspace.wait, need)
+            offset = self._partSize(filPart)
+            headers = {}
+            if offset:
+                headers['Range'] = 'bytes={off}-'.format(off=offset)
+                if self.debug:
+                    logging.debug("Resume download of {name} from byte "
+                                  "{off}".format(name=filDown, off=offset))
+            self.metrics.request()
+            with open(filPart, "ab") as filSave:
+                async with self._request(url, headers) as resp:
+                    self.metrics.update(code=resp.status)
+                    if resp.status != 416:
+                        resp.raise_for_status()
+                    orig_size = self._resumeFile(filSave, resp.status,
+                                                 resp.headers, offset)
+                    hasher = await self._inThread(self._startChecksum, info,
+                                                  filPart, filSave.tell())
+                    if resp.status == 416:
+                        break
+                    space = await self._inThread(self._reserveSpace,
+                                                 filSave, orig_size, False)
+                    if space is None:
+                        need = 0
+                        if orig_size is not None:
+                            need = int(orig_size) - filSave.tell()
+                        continue
+                    with space:
+                        async for chunk in resp.content.iter_chunked(
+                                self.chunksize):
+                            if self.ratelimit:
+                                await asyncio.sleep(
+                                    self.ratelimit.reserve(len(chunk)))
+                            self.metrics.count(len(chunk))
+                            await self._inThread(self._saveChunk, filSave,
+                                                 chunk, hasher)
+            break
+        return await self._inThread(self._completeFile, filDown, filHdf,
+                                    orig_size, info, hasher)
+
+    async def adownloadsAllDay(self, clean=False, allDays=False,
+                               windows=None):
+        """Download all requested days, the lists of files and the files of
+           all days are requested at the same time
+
+           :param bool clean: if True remove the empty files, they could have
+                              some problems in the previous download
+           :param bool allDays: download all passable days
+           :param list windows: download only the days of these periods, see
+                                downModis.getDaysWindows
+
+           :return: the summary of the metrics, see DownloadMetrics.summary
+        """
+        if clean:
+            self.removeEmptyFiles()
+        # get the days to download
+        days = self._selectDays(allDays, windows)
+        if self.debug:
+            logging.debug("The number of days to download is: "
+                          "{num}".format(num=len(days)))
+
+        async def download(day):
+            """Download the files of a day as soon as its list is
+               available"""
+            listAllFiles = await self.agetFilesList(day)
+            listFilesDown = await self._inThread(self.checkDataExist,
+                                                 listAllFiles)
+            self._startDay(day, listAllFiles, listFilesDown)
+            await self.adayDownload(day, listFilesDown)
+
+        await asyncio.gather(*[download(day) for day in days])
+        if self.listcache:
+            self.listcache.save()
+        self.closeFilelist()
+        if self.debug:
+            logging.debug("Download terminated")
+        return self.metrics.summary()
+
+    def _run(self, coro):
+        """Run a coroutine in a new event loop, closing the aiohttp session
+           at the end
+
+           :param coro: the coroutine to run
+        """
+        async def run():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
+
+    def connect(self, ncon=20):
+        """Connect to the server and fill the dirData variable, see aconnect
+
+           :param int ncon: maximum number of attempts to connect to the HTTP
+                            server before failing
+        """
+        self._run(self.aconnect(ncon))
+
+    def downloadsAllDay(self, clean=False, allDays=False, windows=None):
+        """Download all requested days, see adownloadsAllDay
+
+           :param bool clean: if True remove the empty files, they could have
+                              some problems in the previous download
+           :param bool allDays: download all passable days
+           :param list windows: download only the days of these periods, see
+                                downModis.getDaysWindows
+
+           :return: the summary of the metrics, see DownloadMetrics.summary
+        """
+        return self._run(self.adownloadsAllDay(clean, allDays, windows))
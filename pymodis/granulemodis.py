@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+#  class to parse the names of the MODIS files
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to parse the names of the MODIS files, like
+MOD11A1.A2020031.h18v04.006.2020032093402.hdf, used by the download, the
+check and the mosaic of the files
+
+Classes:
+
+* :class:`GranuleName`
+
+Functions:
+
+* :func:`splitNames`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+import functools
+import re
+
+#: the number of names kept by GranuleName.parse, about the files of one
+#: year of a product with several tiles
+CACHESIZE = 65536
+
+# the parts of the name before and after the production date
+_PREFIX = (r'(?P<browse>BROWSE\.)?(?P<product>[A-Za-z0-9_]+)'
+           r'\.A(?P<year>\d{4})(?P<doy>\d{3})'
+           r'\.(?P<tile>h(?P<h>\d{2})v(?P<v>\d{2}))\.(?P<collection>\d{3})\.')
+_SUFFIX = r'(?:\.\d+)?\.(?P<extension>.+)'
+_GRANULE = re.compile('^' + _PREFIX + r'(?P<production>\d{13})' + _SUFFIX +
+                      '$')
+# the names written by modis_check, with * instead of the production date
+_PATTERN = re.compile('^' + _PREFIX + r'(?P<production>\d{13}|\*)' +
+                      _SUFFIX + '$')
+# several names, one for each line
+_GRANULES = re.compile('^' + _PREFIX + r'(?P<production>\d{13})' + _SUFFIX +
+                       '$', re.MULTILINE)
+
+
+def splitNames(names):
+    """Return the parts of many names of MODIS files at once, it is faster
+       than GranuleName.parse because the objects are not created. The
+       names that are not MODIS files are skipped
+
+       :param names: an iterable of names of files, without the path
+
+       :return: a list of tuples of strings (browse, product, year, doy,
+                tile, h, v, collection, production, extension); browse is
+                an empty string for the files that are not JPG browse files
+    """
+    return _GRANULES.findall('\n'.join(names))
+
+
+@functools.total_ordering
+class GranuleName(object):
+    """The parts of the name of a MODIS file. Use :meth:`parse` to get
+       the object of a name, the objects are shared so they must not be
+       modified. The objects are sorted by product, date, tile, collection
+       and production date
+
+       :param str name: the name of the file
+       :param str product: the product, like MOD11A1
+       :param int year: the year of the data
+       :param int doy: the day of the year of the data
+       :param str tile: the tile in the format hXXvYY
+       :param str collection: the collection, like 006
+       :param str production: the production date in the format
+                              YYYYDDDHHMMSS
+       :param str extension: the extension, like hdf or hdf.xml
+       :param bool browse: True for the JPG browse files
+    """
+    __slots__ = ('name', 'product', 'year', 'doy', 'tile', 'h', 'v',
+                 'collection', 'production', 'extension', 'browse')
+
+    def __init__(self, name, product, year, doy, tile, collection,
+                 production, extension, browse=False):
+        """Function to initialize the object"""
+        self.name = name
+        self.product = product
+        self.year = year
+        self.doy = doy
+        self.tile = tile
+        #: the horizontal and vertical position of the tile
+        self.h = int(tile[1:3])
+        self.v = int(tile[4:6])
+        self.collection = collection
+        self.production = production
+        self.extension = extension
+        self.browse = browse
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHESIZE)
+    def parse(name, wildcard=False):
+        """Return the GranuleName object of the name of a MODIS file, like
+           MOD11A1.A2020031.h18v04.006.2020032093402.hdf or its browse file
+           BROWSE.MOD11A1.A2020031.h18v04.006.2020032093402.1.jpg. The
+           last parsed names are cached
+
+           :param str name: the name of the file, without the path
+           :param bool wildcard: True to accept * as production date, like
+                                 in the output of modis_check
+
+           :return: a GranuleName object, None if the name is not a MODIS
+                    tile
+        """
+        match = (_PATTERN if wildcard else _GRANULE).match(name)
+        if not match:
+            return None
+        return GranuleName(name, match.group('product'),
+                           int(match.group('year')), int(match.group('doy')),
+                           match.group('tile'), match.group('collection'),
+                           match.group('production'),
+                           match.group('extension'),
+                           bool(match.group('browse')))
+
+    @property
+    def date(self):
+        """The date of the data in the format YYYYDDD"""
+        return '{ye}{do:03d}'.format(ye=self.year, do=self.doy)
+
+    @property
+    def day(self):
+        """The date of the data as datetime.date object"""
+        return date(self.year, 1, 1) + timedelta(self.doy - 1)
+
+    @property
+    def productionTime(self):
+        """The production date as datetime.datetime object, None for the
+           wildcard"""
+        if self.production == '*':
+            return None
+        return datetime.strptime(self.production, '%Y%j%H%M%S')
+
+    @property
+    def key(self):
+        """The parts of the name without the production date, the same for
+           all the versions of a file"""
+        return (self.browse, self.product, self.year, self.doy, self.tile,
+                self.collection, self.extension)
+
+    @property
+    def prefix(self):
+        """The product and the date of the name, like MOD11A1.A2020031"""
+        return '{pro}.A{dat}'.format(pro=self.product, dat=self.date)
+
+    def isNewer(self, other):
+        """Return True if this file is a newer version of other, the same
+           file produced later
+
+           :param other: a GranuleName object
+        """
+        return self.key == other.key and self.production > other.production
+
+    def _sortKey(self):
+        """Return the values used to sort the objects"""
+        return (self.product, self.year, self.doy, self.tile,
+                self.collection, self.production, self.browse,
+                self.extension, self.name)
+
+    def __eq__(self, other):
+        if not isinstance(other, GranuleName):
+            return NotImplemented
+        return self.name == other.name
+
+    def __lt__(self, other):
+        if not isinstance(other, GranuleName):
+            return NotImplemented
+        return self._sortKey() < other._sortKey()
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return 'GranuleName({name!r})'.format(name=self.name)
+
+    def __str__(self):
+        return self.name
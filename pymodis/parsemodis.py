@@ -32,6 +32,8 @@ Classes:
 from builtins import dict
 import os
 
+from .granulemodis import GranuleName
+
 # lists of parameters accepted by resample MRT software
 # projections
 PROJ_LIST = ['AEA', 'GEO', 'HAM', 'IGH', 'ISIN', 'LA', 'LCC', 'MOL', 'PS',
@@ -74,7 +76,13 @@ class parseModis:
         with open(self.xmlname) as f:
             self.tree = ElementTree.parse(f)
         # return the code of tile for conf file
-        self.code = os.path.split(self.hdfname)[1].split('.')[-2]
+        granule = GranuleName.parse(os.path.basename(self.hdfname))
+        if granule:
+            self.code = granule.production
+        else:
+            self.code = os.path.split(self.hdfname)[1].split('.')[-2]
+        #: the GranuleName object of the file, None for other names
+        self.granule = granule
         self.path = os.path.split(self.hdfname)[0]
 
     def __str__(self):
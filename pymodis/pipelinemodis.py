@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#  class to mosaic and reproject the MODIS days while they are downloaded
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to mosaic and reproject the days downloaded by downModis in a
+pool of workers, a day is processed as soon as all its files are
+downloaded while the next days are still downloading. GDAL is imported
+only by the workers
+
+Classes:
+
+* :class:`ProcessPipeline`
+
+Functions:
+
+* :func:`outputPrefix`
+* :func:`processDay`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from .granulemodis import GranuleName
+
+
+def outputPrefix(files, folder):
+    """Return the prefix of the output files of a day, the product and the
+       date of the first file (for example MOD11A1.A2012001)
+
+       :param list files: the HDF files of the day
+       :param str folder: the folder of the output files
+    """
+    name = os.path.basename(sorted(files)[0])
+    granule = GranuleName.parse(name)
+    if granule:
+        return os.path.join(folder, granule.prefix)
+    return os.path.join(folder, '.'.join(name.split('.')[:2]))
+
+
+def processDay(files, prefix, subset, res=None, outformat="GTiff",
+               epsg=None, wkt=None, resampl='NEAREST_NEIGHBOR', quiet=True):
+    """Mosaic the files of a day with createMosaicGDAL, as VRT files, and
+       reproject the mosaic with convertModisGDAL. A single file is only
+       reprojected
+
+       :param list files: the HDF files of the day
+       :param str prefix: the prefix of the output files
+       :param str subset: the subset of layers to consider, like '( 1 0 )'
+       :param int res: output resolution, None to keep the resolution of
+                       the input
+       :param str outformat: output format supported by GDAL
+       :param int epsg: the EPSG code of the output projection
+       :param str wkt: the WKT string or file of the output projection
+       :param str resampl: the resampling method to use
+       :param bool quiet: False to print the processed layers
+
+       :return: the prefix of the output files
+    """
+    # GDAL is loaded only when a day is processed
+    from .convertmodis_gdal import createMosaicGDAL
+    from .convertmodis_gdal import convertModisGDAL
+    if len(files) == 1:
+        convertModisGDAL(files[0], prefix, subset, res, outformat, epsg,
+                         wkt, resampl).run(quiet=quiet)
+        return prefix
+    mosaic = createMosaicGDAL(files, subset)
+    mosaic.write_vrt(prefix, quiet=quiet)
+    # write_vrt writes a file for each layer
+    for layer in mosaic.file_infos.keys():
+        name = "{pref}_{lay}".format(pref=prefix, lay=layer)
+        convertModisGDAL("{name}.vrt".format(name=name), name, subset, res,
+                         outformat, epsg, wkt, resampl,
+                         vrt=True).run(quiet=quiet)
+    return prefix
+
+
+class ProcessPipeline:
+    """Mosaic and reproject the days in a pool of workers while they are
+       downloaded. The object is the onday function of downModis, see
+       download
+
+       :param str outputFolder: the folder of the output files
+       :param str subset: the subset of layers to consider, like '( 1 0 )'
+       :param int res: output resolution, None to keep the resolution of
+                       the input
+       :param str outformat: output format supported by GDAL
+       :param int epsg: the EPSG code of the output projection
+       :param str wkt: the WKT string or file of the output projection
+       :param str resampl: the resampling method to use
+       :param int workers: the number of days processed at the same time
+       :param bool processes: True to process the days in other processes
+                              instead of threads
+    """
+    def __init__(self, outputFolder, subset, res=None, outformat="GTiff",
+                 epsg=None, wkt=None, resampl='NEAREST_NEIGHBOR', workers=2,
+                 processes=False):
+        """Function to initialize the object"""
+        if not epsg and not wkt:
+            raise ValueError('You have to set one of the following option: '
+                             '"epsg", "wkt"')
+        if not os.path.isdir(outputFolder):
+            raise IOError("The folder {fold} does not exist".format(
+                fold=outputFolder))
+        self.outputFolder = outputFolder
+        self.options = {'subset': subset, 'res': res, 'outformat': outformat,
+                        'epsg': epsg, 'wkt': wkt, 'resampl': resampl}
+        self.workers = max(1, int(workers))
+        if processes:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        #: the future of each processed day, the keys are tuples
+        #: (product, day)
+        self.futures = {}
+
+    def __call__(self, day, files):
+        """Add a day to process, called by downModis when the files of the
+           day are downloaded
+
+           :param str day: the day in format YYYY.MM.DD
+           :param list files: the HDF files of the day
+        """
+        prefix = outputPrefix(files, self.outputFolder)
+        # the same day of several products, like in a batch download
+        product = os.path.basename(prefix).split('.')[0]
+        logging.debug("Processing {num} files of {pro} day {day}".format(
+            num=len(files), pro=product, day=day))
+        self.futures[(product, day)] = self._pool.submit(
+            processDay, sorted(files), prefix, **self.options)
+
+    def wait(self):
+        """Wait until all the added days are processed
+
+           :return: a dictionary with the prefix of the output files of each
+                    product and day, the keys are tuples (product, day); the
+                    errors are logged and the days are not included
+        """
+        wait(list(self.futures.values()))
+        results = {}
+        for key, fut in sorted(self.futures.items()):
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                logging.error("Error processing {pro} day {day}: {err}".format(
+                    pro=key[0], day=key[1], err=e))
+        return results
+
+    def close(self):
+        """Wait for the running days and stop the workers"""
+        self._pool.shutdown(wait=True)
+
+    def download(self, modis, clean=False, allDays=False, windows=None):
+        """Download the days with a downModis object and process each day
+           as soon as its files are downloaded
+
+           :param modis: the downModis object, already connected
+           :param bool clean: if True remove the empty files, they could have
+                              some problems in the previous download
+           :param bool allDays: download all passable days
+           :param list windows: download only the days of these periods, see
+                                downModis.getDaysWindows
+
+           :return: a dictionary with the prefix of the output files of each
+                    product and day, see wait
+        """
+        modis.onday = self
+        try:
+            modis.downloadsAllDay(clean=clean, allDays=allDays,
+                                  windows=windows)
+        finally:
+            modis.onday = None
+        return self.wait()
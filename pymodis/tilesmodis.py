@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+#  functions to select the tiles of the MODIS sinusoidal grid
+#
+##################################################################
+#
+#  This MODIS Python class is licensed under the terms of GNU GPL 2.
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License as
+#  published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+##################################################################
+"""Module to compute the tiles of the MODIS sinusoidal grid intersecting
+a bounding box or a polygon in geographic coordinates (longitude and
+latitude in degrees, WGS84)
+
+Classes:
+
+* :class:`TileGrid`
+
+Functions:
+
+* :func:`tileGrid`
+* :func:`tileBounds`
+* :func:`tilesFromPoints`
+* :func:`tilesFromBbox`
+* :func:`tilesFromWkt`
+* :func:`parseWkt`
+
+"""
+
+# python 2 and 3 compatibility
+from __future__ import print_function
+from __future__ import division
+
+import functools
+import re
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('Numpy library not found, please install it')
+
+#: radius of the sphere of the MODIS sinusoidal projection (meters)
+RADIUS = 6371007.181
+#: size of a tile (meters)
+TILESIZE = 1111950.5197665
+#: number of horizontal and vertical tiles
+HTILES = 36
+VTILES = 18
+#: maximum distance between two vertices of a polygon (degrees), the edges
+#: are straight lines in geographic coordinates and curves in the grid
+DENSIFY = 0.25
+
+
+class TileGrid:
+    """The geometry of all the tiles of the MODIS sinusoidal grid, as
+       numpy arrays with one element for each tile. Use :func:`tileGrid`
+       to get the cached instance
+    """
+    def __init__(self):
+        """Function to initialize the object"""
+        v, h = np.mgrid[0:VTILES, 0:HTILES]
+        self.h = h.ravel()
+        self.v = v.ravel()
+        #: the names of the tiles, in the format hXXvYY
+        self.names = np.array(['h{h:02d}v{v:02d}'.format(h=hh, v=vv)
+                               for hh, vv in zip(self.h, self.v)])
+        # bounds in sinusoidal coordinates
+        self.xmin = -HTILES / 2 * TILESIZE + self.h * TILESIZE
+        self.xmax = self.xmin + TILESIZE
+        self.ymax = VTILES / 2 * TILESIZE - self.v * TILESIZE
+        self.ymin = self.ymax - TILESIZE
+        # the latitude depends only on y
+        self.south = np.degrees(self.ymin / RADIUS)
+        self.north = np.degrees(self.ymax / RADIUS)
+        #: position of each tile in the arrays
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+
+    def bounds(self, tile):
+        """Return the bounds of a tile in sinusoidal coordinates
+           (xmin, ymin, xmax, ymax) and its latitude range (south, north)
+
+           :param str tile: the name of the tile in the format hXXvYY
+        """
+        i = self.index[tile]
+        return ((self.xmin[i], self.ymin[i], self.xmax[i], self.ymax[i]),
+                (self.south[i], self.north[i]))
+
+
+@functools.lru_cache(maxsize=1)
+def tileGrid():
+    """Return the TileGrid object, it is computed only once"""
+    return TileGrid()
+
+
+def tileBounds(tile):
+    """Return the bounds of a tile in sinusoidal coordinates
+       (xmin, ymin, xmax, ymax) and its latitude range (south, north)
+
+       :param str tile: the name of the tile in the format hXXvYY
+    """
+    return tileGrid().bounds(tile)
+
+
+def project(lon, lat):
+    """Project geographic coordinates to the MODIS sinusoidal projection
+
+       :param lon: the longitudes in degrees
+       :param lat: the latitudes in degrees
+
+       :return: two numpy arrays with x and y in meters
+    """
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    return RADIUS * lon * np.cos(lat), RADIUS * lat
+
+
+def tilesFromPoints(lon, lat):
+    """Return the tiles containing some points
+
+       :param lon: the longitudes in degrees
+       :param lat: the latitudes in degrees
+
+       :return: a numpy array with the names of the tiles
+    """
+    x, y = project(lon, lat)
+    h = np.clip(np.floor((x + HTILES / 2 * TILESIZE) / TILESIZE), 0,
+                HTILES - 1).astype(int)
+    v = np.clip(np.floor((VTILES / 2 * TILESIZE - y) / TILESIZE), 0,
+                VTILES - 1).astype(int)
+    return tileGrid().names[v * HTILES + h]
+
+
+def _bboxMask(west, south, east, north):
+    """Return a boolean array with the tiles intersecting a bounding box,
+       the box must not cross the antimeridian
+
+       :param float west: the minimum longitude
+       :param float south: the minimum latitude
+       :param float east: the maximum longitude
+       :param float north: the maximum latitude
+    """
+    grid = tileGrid()
+    south = max(south, -90.0)
+    north = min(north, 90.0)
+    lats = np.maximum(grid.south, south)
+    latn = np.minimum(grid.north, north)
+    inlat = lats <= latn
+    # at a latitude the longitudes of a tile are xmin / (R cos(lat)) and
+    # xmax / (R cos(lat)), the widest and the narrowest extents are at the
+    # latitudes of the overlap farthest and nearest to the equator
+    far = np.maximum(np.abs(lats), np.abs(latn))
+    near = np.where((lats <= 0) & (latn >= 0), 0,
+                    np.minimum(np.abs(lats), np.abs(latn)))
+    with np.errstate(divide='ignore'):
+        kfar = 1 / np.cos(np.radians(np.minimum(far, 90.0)))
+        knear = 1 / np.cos(np.radians(near))
+    lonmin = np.degrees(grid.xmin / RADIUS)
+    lonmax = np.degrees(grid.xmax / RADIUS)
+    with np.errstate(invalid='ignore'):
+        west_tile = np.minimum(lonmin * kfar, lonmin * knear)
+        east_tile = np.maximum(lonmax * kfar, lonmax * knear)
+    inlon = (west_tile <= min(east, 180.0)) & (east_tile >= max(west, -180.0))
+    return inlat & inlon
+
+
+def _parseBbox(bbox):
+    """Return the four values of a bounding box
+
+       :param bbox: a string 'west,south,east,north' or a sequence of four
+                    numbers
+    """
+    if isinstance(bbox, str):
+        bbox = bbox.replace(' ', '').split(',')
+    try:
+        west, south, east, north = [float(b) for b in bbox]
+    except ValueError:
+        raise ValueError("The bounding box must contain four values: "
+                         "west,south,east,north")
+    if south > north:
+        raise ValueError("The south value of the bounding box is greater "
+                         "than the north value")
+    return west, south, east, north
+
+
+def tilesFromBbox(bbox):
+    """Return the tiles intersecting a bounding box in geographic
+       coordinates. A box with west greater than east crosses the
+       antimeridian
+
+       :param bbox: a string 'west,south,east,north' or a sequence of four
+                    numbers, in degrees
+
+       :return: a sorted list with the names of the tiles
+    """
+    west, south, east, north = _parseBbox(bbox)
+    if west <= east:
+        mask = _bboxMask(west, south, east, north)
+    else:
+        mask = _bboxMask(west, south, 180.0, north) | \
+            _bboxMask(-180.0, south, east, north)
+    return sorted(tileGrid().names[mask].tolist())
+
+
+def parseWkt(wkt):
+    """Return the rings of a WKT POLYGON or MULTIPOLYGON geometry
+
+       :param str wkt: the geometry in WKT format, in geographic
+                       coordinates
+
+       :return: a list of numpy arrays with two columns, longitude and
+                latitude
+    """
+    wkt = wkt.strip()
+    match = re.match(r'^(MULTI)?POLYGON\s*(Z|M|ZM)?\s*\((.*)\)$', wkt,
+                     re.IGNORECASE | re.DOTALL)
+    if not match:
+        raise ValueError("Only POLYGON and MULTIPOLYGON geometries are "
+                         "supported")
+    rings = []
+    # the rings are the groups of coordinates without parenthesis
+    for ring in re.findall(r'\(([^()]+)\)', match.group(3)):
+        coords = [c.split()[:2] for c in ring.split(',') if c.strip()]
+        rings.append(np.array(coords, dtype=float))
+    if not rings:
+        raise ValueError("The geometry is empty")
+    return rings
+
+
+def _densify(ring, step=DENSIFY):
+    """Add vertices to a ring so that its edges are shorter than step
+
+       :param ring: a numpy array with longitude and latitude columns
+       :param float step: the maximum length of the edges in degrees
+    """
+    start = ring[:-1]
+    delta = ring[1:] - start
+    parts = np.maximum(1, np.ceil(np.abs(delta).max(axis=1) / step))
+    parts = parts.astype(int)
+    edge = np.repeat(np.arange(len(start)), parts)
+    # position of each new vertex along its edge
+    frac = np.arange(parts.sum()) - np.repeat(np.cumsum(parts) - parts,
+                                              parts)
+    frac = frac / np.repeat(parts, parts)
+    points = start[edge] + delta[edge] * frac[:, None]
+    return np.vstack([points, ring[-1:]])
+
+
+def tilesFromWkt(wkt):
+    """Return the tiles intersecting a polygon. A tile intersects the
+       polygon if an edge of the polygon crosses it or if its center is
+       inside the polygon
+
+       :param str wkt: the geometry in WKT format (POLYGON or MULTIPOLYGON)
+                       in geographic coordinates
+
+       :return: a sorted list with the names of the tiles
+    """
+    grid = tileGrid()
+    rings = parseWkt(wkt)
+    # candidate tiles from the bounding box of the polygon
+    allpoints = np.vstack(rings)
+    candidates = np.flatnonzero(_bboxMask(allpoints[:, 0].min(),
+                                          allpoints[:, 1].min(),
+                                          allpoints[:, 0].max(),
+                                          allpoints[:, 1].max()))
+    xmin = grid.xmin[candidates][:, None]
+    xmax = grid.xmax[candidates][:, None]
+    ymin = grid.ymin[candidates][:, None]
+    ymax = grid.ymax[candidates][:, None]
+    cx = (xmin + xmax) / 2
+    cy = (ymin + ymax) / 2
+    crossed = np.zeros(len(candidates), dtype=bool)
+    inside = np.zeros(len(candidates), dtype=bool)
+    for ring in rings:
+        if not np.array_equal(ring[0], ring[-1]):
+            ring = np.vstack([ring, ring[:1]])
+        x, y = project(*_densify(ring).T)
+        x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+        # edges crossing the tiles, with the separating axis test: the
+        # bounding boxes overlap and the corners of the tile are not all
+        # on the same side of the edge
+        overlap = (np.minimum(x0, x1) <= xmax) & \
+            (np.maximum(x0, x1) >= xmin) & \
+            (np.minimum(y0, y1) <= ymax) & (np.maximum(y0, y1) >= ymin)
+        dx = x1 - x0
+        dy = y1 - y0
+        sides = [dx * (cy_ - y0) - dy * (cx_ - x0)
+                 for cx_, cy_ in ((xmin, ymin), (xmin, ymax), (xmax, ymin),
+                                  (xmax, ymax))]
+        low = np.minimum.reduce(sides)
+        high = np.maximum.reduce(sides)
+        crossed |= (overlap & (low <= 0) & (high >= 0)).any(axis=1)
+        # centers of the tiles inside the ring, with the even-odd rule so
+        # the holes are excluded
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xcross = x0 + (cy - y0) * dx / dy
+        hits = ((y0 > cy) != (y1 > cy)) & (cx < xcross)
+        inside ^= (hits.sum(axis=1) % 2).astype(bool)
+    return sorted(grid.names[candidates[crossed | inside]].tolist())
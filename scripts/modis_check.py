@@ -20,14 +20,8 @@
 ##################################################################
 """script to check which tiles are missing"""
 
-import glob
 import os
 import sys
-import calendar
-import copy
-from datetime import datetime
-
-from collections import OrderedDict
 
 try:
     from pymodis import optparse_gui
@@ -35,6 +29,7 @@ try:
 except:
     WXPYTHON = False
 from pymodis import optparse_required
+from pymodis import checkmodis
 
 def main():
     """Main function"""
@@ -64,19 +59,22 @@ def main():
 
     # first day
     parser.add_option("-f", "--firstday", dest="today", default=None,
-                      help="the day to start download [default=%default is for"
-                      " today]; if you want change data you must use "
-                      "this format YYYY-MM-DD", metavar="FIRST_DAY")
+                      help="the first day to check [default=the first of "
+                      "January of the first year in the folder]; if you "
+                      "want change data you must use this format "
+                      "YYYY-MM-DD", metavar="FIRST_DAY")
     # last day
     parser.add_option("-e", "--endday", dest="enday", default=None,
-                      metavar="LAST_DAY", help="the day to stop download "
-                      "[default=%default]; if you want change"
-                      " data you must use this format YYYY-MM-DD")
+                      metavar="LAST_DAY", help="the last day to check "
+                      "[default=the last day of the last year in the "
+                      "folder]; if you want change data you must use this "
+                      "format YYYY-MM-DD")
 
     # number of days
     parser.add_option("-d", "--days", dest="days", default=1, metavar="DAYS",
-                      help="The temporal resolution of the dataset, "
-                      "[default=%default]")
+                      help="The temporal resolution of the dataset, 8 or 16 "
+                      "for the composites, they start again on the first of "
+                      "January [default=%default]")
 
     # return options and argument
     (options, args) = parser.parse_args()
@@ -89,62 +87,22 @@ def main():
     if not os.path.isdir(args[0]):
         parser.error("The destination folder is not a dir or not exists")
 
-    sday = 1
-    if options.today:
-        sday = int(datetime.strptime(options.today, "%Y-%m-%d").strftime("%j"))
-    eday = 366
-    if options.enday:
-        eday = int(datetime.strptime(options.enday, "%Y-%m-%d").strftime("%j"))
-    tres = int(options.days)
-
+    # the folder is scanned once, the days and tiles are checked with a
+    # boolean matrix
+    try:
+        gaps = checkmodis.GapAnalysis(args[0], options.prod,
+                                      tiles=options.tiles,
+                                      collection=options.mver,
+                                      start=options.today, end=options.enday,
+                                      period=int(options.days))
+    except ValueError as e:
+        parser.error(str(e))
     if options.outs == "stdout":
         write = sys.stdout
     else:
         write = open(options.outs, 'w')
-
-    files = glob.glob(os.path.join(args[0], '*.hdf'))
-    tiles = options.tiles.split(',')
-    output = OrderedDict()
-    missing_dates = {}
-    for fi in files:
-        if fi.startswith('./'):
-            fi = fi.lstrip('./')
-        if fi.count('.') != 5:
-            print("Error with file {fi}, to many dots, skipping it. Please " \
-                  "to be sure run it for the same folder containing the HDF" \
-                  " file".format(fi=fi))
-            continue
-        fisplit = fi.split('.')
-        dat = fisplit[1]
-        year = int(dat[1:5])
-        if year not in missing_dates.keys():
-            if eday == 366 and calendar.isleap(year):
-                eday = 367
-            missing_dates[year] = list(range(sday, eday, tres))
-        doy = int(dat[5:8])
-        try:
-            missing_dates[year].remove(doy)
-        except ValueError:
-            pass
-        if dat not in output.keys():
-            output[dat] = copy.deepcopy(tiles)
-        try:
-            output[dat].remove(fisplit[2])
-        except ValueError:
-            continue
-    for k, v in missing_dates.items():
-        for dat in v:
-            for ti in tiles:
-                yd = "A{ye}{do}".format(ye=k, do=str(dat).zfill(3))
-                write.write("{co}\n".format(co=".".join((options.prod, yd, ti,
-                                                         options.mver, '*',
-                                                         'hdf*'))))
-    for k, v in output.items():
-        if len(v) != 0:
-            for ti in v:
-                write.write("{co}\n".format(co=".".join((options.prod, k,
-                                                         ti, options.mver,
-                                                         '*', 'hdf*'))))
+    # the output can be read by modis_download_from_list
+    gaps.write(write)
     if options.outs != "stdout":
         write.close()
 
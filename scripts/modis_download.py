@@ -29,6 +29,9 @@ except:
     WXPYTHON = False
 from pymodis import optparse_required
 from pymodis import downmodis
+from pymodis import batchmodis
+from pymodis import pipelinemodis
+from optparse import OptionGroup
 
 
 def main():
@@ -61,6 +64,16 @@ def main():
     parser.add_option("-t", "--tiles", dest="tiles", default=None,
                       help="string of tiles separated with comma "
                       "[default=%default for all tiles]")
+    # area of interest
+    parser.add_option("--bbox", dest="bbox", default=None,
+                      help="bounding box in geographic coordinates "
+                      "'west,south,east,north', the intersecting tiles are "
+                      "added to the tiles to download")
+    parser.add_option("--aoi", dest="aoi", default=None,
+                      help="POLYGON or MULTIPOLYGON in WKT format, or a file "
+                      "containing it, in geographic coordinates; the "
+                      "intersecting tiles are added to the tiles to "
+                      "download")
     # path to add the path in the server
     parser.add_option("-s", "--source", dest="path", default="MOLT",
                       help="directory on the http/ftp server "
@@ -103,6 +116,83 @@ def main():
     parser.add_option("-r", dest="empty", action="store_true", default=False,
                       help="remove empty files (size equal to zero) from "
                       "'destination_folder'  [default=%default]")
+    # cache of the server listings
+    parser.add_option("-c", "--cache", dest="cache", action="store_true",
+                      default=False, help="store the listings of the HTTP "
+                      "server in 'destination_folder' and reuse them in the "
+                      "next runs [default=%default]")
+    # granule search instead of the listings
+    parser.add_option("--search", dest="search", action="store_true",
+                      default=False, help="discover the files with the NASA"
+                      " CMR granule search instead of the listings of the "
+                      "HTTP server [default=%default]")
+    # database with the state of the downloaded files
+    parser.add_option("-S", "--state", dest="state", action="store_true",
+                      default=False, help="store the state of the downloaded"
+                      " files in a database inside 'destination_folder', "
+                      "avoiding to scan the folder [default=%default]")
+    # checksum verification
+    parser.add_option("-k", "--checksum", dest="checksum", action="store_true",
+                      default=False, help="verify the HDF files with the "
+                      "size and checksum of their XML metadata file instead "
+                      "of opening them with GDAL [default=%default]")
+    # bandwidth limit
+    parser.add_option("--max-rate", dest="maxrate", type="float",
+                      default=None, help="maximum download rate of all the "
+                      "transfers, in bytes per second [default=no limit]")
+    # free space of the destination folder
+    parser.add_option("--min-free", dest="minfree", type="float",
+                      default=None, help="check the free space before each "
+                      "transfer, allocate the files before writing them "
+                      "and pause the downloads while the free space of "
+                      "'destination_folder' is less than this number of "
+                      "bytes [default=no check]")
+    # request rate limit
+    parser.add_option("--max-requests-per-second", dest="maxrequests",
+                      type="float", default=None, help="maximum number of "
+                      "requests sent to the server each second "
+                      "[default=no limit]")
+    # metrics exporters
+    parser.add_option("--metrics-json", dest="metricsjson", default=None,
+                      help="append a JSON line with the metrics of each "
+                      "downloaded file and listing to this file")
+    parser.add_option("--metrics-prom", dest="metricsprom", default=None,
+                      help="write the summary of the download in the "
+                      "Prometheus text format to this file, it can be read "
+                      "by the textfile collector of node exporter")
+    # number of parallel downloads
+    parser.add_option("-w", "--workers", dest="workers", default=1,
+                      help="number of files to download in parallel "
+                      "[default=%default]")
+    # several products and periods
+    parser.add_option("--jobs", dest="jobs", default=None,
+                      help="JSON file with several products, tiles and "
+                      "periods to download with the same connections; the "
+                      "other options are the defaults of the jobs")
+    # mosaic and reprojection of the downloaded days
+    groupC = OptionGroup(parser, 'Options to mosaic and reproject each day '
+                         'while the next days are downloading, with GDAL')
+    groupC.add_option("--convert-subset", dest="convsubset", default=None,
+                      help="a subset of product's layers, it enables the "
+                      "conversion. The string should be similar to: ( 1 0 )")
+    groupC.add_option("--convert-output", dest="convoutput", default=None,
+                      help="the folder of the converted files "
+                      "[default=destination_folder]")
+    groupC.add_option("--convert-epsg", dest="convepsg", default=None,
+                      help="EPSG code for the output")
+    groupC.add_option("--convert-wkt", dest="convwkt", default=None,
+                      help="file or string containing projection definition"
+                      " in WKT format")
+    groupC.add_option("--convert-grain", dest="convres", type="float",
+                      default=None, help="the spatial resolution of output "
+                      "file")
+    groupC.add_option("--convert-format", dest="convformat", default="GTiff",
+                      help="output format supported by GDAL "
+                      "[default=%default]")
+    groupC.add_option("--convert-workers", dest="convworkers", default=2,
+                      help="number of days converted in parallel "
+                      "[default=%default]")
+    parser.add_option_group(groupC)
     #parser.add_option("-A", dest="alldays", action="store_true", default=True,
                       #help="download all days from the first")
 
@@ -143,6 +233,59 @@ def main():
         password = options.password
         token = options.token
 
+    # read the area of interest from a file
+    if options.aoi and os.path.isfile(options.aoi):
+        with open(options.aoi) as f:
+            options.aoi = f.read()
+    metrics = downmodis.DownloadMetrics(options.metricsjson)
+    diskspace = None
+    if options.minfree is not None:
+        diskspace = options.minfree or True
+    pipeline = None
+    if options.convsubset:
+        try:
+            pipeline = pipelinemodis.ProcessPipeline(
+                options.convoutput or args[0], options.convsubset,
+                options.convres, options.convformat, options.convepsg,
+                options.convwkt, workers=int(options.convworkers))
+        except (IOError, ValueError) as e:
+            parser.error("Error in the conversion options: {err}".format(
+                err=e))
+    if options.jobs:
+        # the options set by the user are the defaults of the jobs
+        defaults = {'url': options.url, 'path': options.path,
+                    'delta': int(options.delta), 'jpg': options.jpg,
+                    'search': options.search, 'alldays': options.alldays}
+        for key, value in (('tiles', options.tiles), ('today', options.today),
+                           ('enddate', options.enday), ('bbox', options.bbox),
+                           ('aoi', options.aoi)):
+            if value:
+                defaults[key] = value
+        try:
+            jobs = batchmodis.readJobs(options.jobs, defaults)
+            batch = batchmodis.BatchDownload(jobs, args[0], user=user,
+                                             password=password, token=token,
+                                             workers=int(options.workers),
+                                             listcache=options.cache,
+                                             statedb=options.state,
+                                             maxrate=options.maxrate,
+                                             maxrequests=options.maxrequests,
+                                             metrics=metrics,
+                                             checksum=options.checksum,
+                                             diskspace=diskspace,
+                                             onday=pipeline,
+                                             debug=options.debug)
+        except (IOError, ValueError, KeyError) as e:
+            parser.error("Error in the jobs file: {err}".format(err=e))
+        if not batch.connect():
+            parser.error("A problem with the connection occured")
+        batch.downloadsAllJobs(clean=options.empty)
+        if pipeline:
+            pipeline.wait()
+            pipeline.close()
+        if options.metricsprom:
+            metrics.writePrometheus(options.metricsprom)
+        return
     # set modis object
     modisOgg = downmodis.downModis(url=options.url, 
                                    user=user,
@@ -153,12 +296,29 @@ def main():
                                    product=options.prod, today=options.today,
                                    enddate=options.enday, jpg=options.jpg,
                                    delta=int(options.delta),
-                                   debug=options.debug)
+                                   debug=options.debug,
+                                   workers=int(options.workers),
+                                   listcache=options.cache,
+                                   statedb=options.state,
+                                   checksum=options.checksum,
+                                   maxrate=options.maxrate,
+                                   maxrequests=options.maxrequests,
+                                   metrics=metrics,
+                                   bbox=options.bbox, aoi=options.aoi,
+                                   search=options.search,
+                                   diskspace=diskspace,
+                                   onday=pipeline)
     # connect to ftp
     modisOgg.connect()
     if modisOgg.nconnection <= 20:
         # download data
         modisOgg.downloadsAllDay(clean=options.empty, allDays=options.alldays)
+        if pipeline:
+            pipeline.wait()
+            pipeline.close()
+        if options.metricsprom:
+            modisOgg.metrics.writePrometheus(options.metricsprom,
+                                             modisOgg.product)
     else:
         parser.error("A problem with the connection occured")
 
@@ -21,7 +21,6 @@
 ##################################################################
 """Script to download massive MODIS data from a text file containing a list of
 MODIS file name"""
-from datetime import date
 try:
     from pymodis import optparse_gui
     WXPYTHON = True
@@ -29,9 +28,11 @@ except:
     WXPYTHON = False
 from pymodis import downmodis
 from pymodis import optparse_required
+from pymodis.granulemodis import GranuleName
 import sys
 import os
 import getpass
+import logging
 
 
 def write_out(out, ts, options, day):
@@ -76,11 +77,13 @@ def main():
     parser.add_option("-p", "--product", dest="prod", default="MOD11A1.006",
                       help="product name as on the http/ftp server "
                       "[default=%default]")
-    # path to file with server missing tiles
+    # path to file with the files not downloaded
     parser.add_option("-o", "--outputs", dest="outs", default=None,
-                      help="the output where write the missing files in the"
-                      " server [default=%default]. Use 'stdout' to write to "
-                      " STDOUT")
+                      help="the output where write the files not downloaded,"
+                      " the ones missing in the server and the ones failed "
+                      "and not in the destination folder; it can be used "
+                      "as input of a new run [default=%default]. Use "
+                      "'stdout' to write to STDOUT")
     # use netrc file
     parser.add_option("-n", action="store_true", dest="netrc", default=False,
                       help="use netrc file to read user and password")
@@ -92,6 +95,10 @@ def main():
     parser.add_option("-j", action="store_true", dest="jpg", default=False,
                       help="download also the jpeg overview files "
                       "[default=%default]")
+    # number of parallel downloads
+    parser.add_option("-w", "--workers", dest="workers", default=1,
+                      help="number of files to download in parallel "
+                      "[default=%default]")
     # return options and argument
     (options, args) = parser.parse_args()
     if len(args) == 0 and not WXPYTHON:
@@ -119,15 +126,18 @@ def main():
 
     lines = [elem for elem in f.readlines()]
 
-    vals = {}
+    # the granules to download, as day and tile
+    granules = []
     for elem in lines:
-        if elem != '\n':
-            dat = elem.split('.')[1].replace('A', '')
-            fisplit = elem.strip().split('.')
-            if dat not in vals.keys():
-                vals[dat] = [fisplit[2]]
-            else:
-                vals[dat].append(fisplit[2])
+        if elem.strip():
+            granule = GranuleName.parse(os.path.basename(elem.strip()),
+                                        wildcard=True)
+            if not granule:
+                parser.error("{name} is not the name of a MODIS file".format(
+                    name=elem.strip()))
+            granules.append((granule.day, granule.tile))
+    if not granules:
+        parser.error("The input file does not contain any file name")
 
     if not options.outs:
         write = None
@@ -136,46 +146,36 @@ def main():
     else:
         write = open(options.outs, 'w')
 
-    for d, tiles in sorted(vals.items(), reverse=True):
-        year = int(d[0:4])
-        doy = int(d[4:7])
-        fdate = date.fromordinal(date(year, 1, 1).toordinal() + doy - 1).isoformat()
-        modisOgg = downmodis.downModis(url=options.url, user=user,
-                                       password=password,
-                                       destinationFolder=args[0],
-                                       tiles=','.join(sorted(set(tiles))),
-                                       path=options.path, product=options.prod,
-                                       delta=1, today=fdate,
-                                       debug=options.debug, jpg=options.jpg)
-
-        modisOgg.connect()
-        day = modisOgg.getListDays()[0]
-        if modisOgg.urltype == 'http':
-            listAllFiles = modisOgg.getFilesList(day)
-        else:
-            listAllFiles = modisOgg.getFilesList()
-        if not listAllFiles:
-            if write:
-                write_out(write, tiles, options, d)
-            continue
-        listFilesDown = modisOgg.checkDataExist(listAllFiles)
-
-        if listFilesDown:
-            if options.debug:
-                print(listFilesDown)
-            modisOgg.dayDownload(day, listFilesDown)
-            for fi in listFilesDown:
-                if 'xml' not in fi:
-                    try:
-                        tiles.remove(fi.split('.')[2])
-                    except ValueError:
-                        pass
-            if write:
-                write_out(write, tiles, options, d)
-        if modisOgg.urltype == 'http':
-            modisOgg.closeFilelist()
-        else:
-            modisOgg.closeFTP()
+    days = [gran[0] for gran in granules]
+    tiles = sorted(set(gran[1] for gran in granules))
+    # a single object lists and downloads all the days
+    modisOgg = downmodis.downModis(url=options.url, user=user,
+                                   password=password,
+                                   destinationFolder=args[0],
+                                   tiles=','.join(tiles),
+                                   path=options.path, product=options.prod,
+                                   today=max(days).isoformat(),
+                                   enddate=min(days).isoformat(),
+                                   debug=options.debug, jpg=options.jpg,
+                                   workers=int(options.workers))
+    modisOgg.connect()
+    missing = modisOgg.downloadGranules(granules)
+    if options.debug:
+        logging.debug("Summary of the download: {summ}".format(
+            summ=modisOgg.metrics.summary()))
+    if write:
+        # the tiles not downloaded for each day
+        vals = {}
+        for day, tile in missing:
+            vals.setdefault(day.strftime('%Y%j'), []).append(tile)
+        for d, ts in sorted(vals.items(), reverse=True):
+            write_out(write, ts, options, d)
+        if write is not sys.stdout:
+            write.close()
+    if modisOgg.urltype == 'http':
+        modisOgg.closeFilelist()
+    else:
+        modisOgg.closeFTP()
 
 if __name__ == "__main__":
     main()
@@ -31,6 +31,7 @@ except:
 from pymodis import convertmodis
 from pymodis import convertmodis_gdal
 from pymodis import optparse_required
+from pymodis.granulemodis import GranuleName
 from optparse import OptionGroup
 try:
     import osgeo.gdal as gdal
@@ -122,11 +123,13 @@ def main():
         dire = os.path.dirname(args[0])
         with open(args[0]) as f:
             for l in f:
-                name = os.path.splitext(l.strip())[0]
-                day = name.split('.')[1]
+                granule = GranuleName.parse(os.path.basename(l.strip()))
+                if not granule:
+                    continue
+                day = "A{da}".format(da=granule.date)
                 if day not in tiles.keys():
                     tiles[day] = list()
-                if '.hdf' not in name:
+                if granule.extension == 'hdf':
                     if dire not in l:
                         fname = os.path.join(dire, l.strip())
                     else:
@@ -53,7 +53,11 @@ setup(
     py_modules=['pymodis.downmodis', 'pymodis.convertmodis',
                 'pymodis.parsemodis', 'pymodis.optparse_required',
                 'pymodis.optparse_gui', 'pymodis.qualitymodis',
-                'pymodis.convertmodis_gdal',  'pymodis.productmodis'],
+                'pymodis.convertmodis_gdal',  'pymodis.productmodis',
+                'pymodis.downmodis_async', 'pymodis.tilesmodis',
+                'pymodis.batchmodis', 'pymodis.benchmodis',
+                'pymodis.pipelinemodis', 'pymodis.granulemodis',
+                'pymodis.checkmodis'],
     #packages = ['pymodis'],
     scripts=['scripts/modis_download.py', 'scripts/modis_multiparse.py',
              'scripts/modis_parse.py', 'scripts/modis_mosaic.py',
@@ -67,7 +71,8 @@ setup(
     description='Python library for MODIS data',
     long_description=README,
     install_requires=install_requires,
-    extras_require={'GUI': ["wxPython", "wxPython-common"]},
+    extras_require={'GUI': ["wxPython", "wxPython-common"],
+                    'async': ["aiohttp"]},
     license='GNU GPL 2 or later',
     platforms=['Any'],
     classifiers=[